@@ -1,7 +1,6 @@
 from decimal import Decimal
 from django.conf import settings
-from django.shortcuts import get_object_or_404
-from products.models import Product
+from .utils import get_bag, resolve_bag
 
 # This is a context processor
 # It's purpose is to make this dictionary available to
@@ -13,35 +12,26 @@ def bag_contents(request):
     bag_items = []
     total = 0
     product_count = 0
-    bag = request.session.get("bag", {})
+    # Pages rendered for the page cache are shared by every anonymous
+    # visitor, so they're rendered with an empty bag. The visitor's own
+    # bag total is filled in by the bag_summary view
+    if getattr(request, "page_cache_render", False):
+        bag = {}
+    else:
+        bag = get_bag(request)
 
-    for item_id, item_data in bag.items():
-        
-        # Item_data being an int means the item in question has no sizes
-        # The integer will simply be the quantity of said item
-        if isinstance(item_data, int):
-            product = get_object_or_404(Product, pk=item_id)
-            total += item_data * product.price
-            product_count += item_data
-            bag_items.append({
-                "item_id": item_id,
-                "quantity": item_data,
-                "product": product,
-            })
-        
-        else:
-            
-            product = get_object_or_404(Product, pk=item_id)
-            # If it's not an int, it'll be a dictionary meaning the item does have a size
-            for size, quantity in item_data['items_by_size'].items():
-                total += quantity * product.price
-                product_count += quantity
-                bag_items.append({
-                    "item_id": item_id,
-                    "quantity": quantity,
-                    "product": product,
-                    "size": size,
-                })
+    # Get every variant in the bag along with it's product in one query
+    for variant, quantity in resolve_bag(bag):
+        product = variant.product
+        total += quantity * product.price
+        product_count += quantity
+        bag_items.append({
+            "item_id": variant.pk,
+            "quantity": quantity,
+            "product": product,
+            # Products without sizes have a variant with a blank size
+            "size": variant.size or None,
+        })
 
 
     if total < settings.FREE_DELIVERY_THRESHOLD:
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.view_bag, name="view_bag"),
+    path('summary/', views.bag_summary, name="bag_summary"),
     path('add/<item_id>', views.add_to_bag, name="add_to_bag"),
     path('adjust/<item_id>', views.adjust_bag, name="adjust_bag"),
     path('remove/<item_id>', views.remove_from_bag, name="remove_from_bag"),
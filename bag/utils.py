@@ -0,0 +1,78 @@
+from products.models import ProductVariant
+
+# The bag is stored in the session as a dictionary of
+# {variant id: quantity}, e.g {"12": 2, "40": 1}.
+# Bags from before variants existed were keyed by product id, with
+# sized products holding a quantity for each size. The bag version
+# tells the two apart, so old bags can be converted
+BAG_VERSION = 2
+
+
+def _convert_old_bag(bag):
+    """
+    Convert a bag keyed by product id into one keyed by variant id
+    """
+    variants = {
+        (variant.product_id, variant.size): variant.pk
+        for variant in ProductVariant.objects.filter(product_id__in=list(bag.keys()))
+    }
+
+    new_bag = {}
+    for item_id, item_data in bag.items():
+        if isinstance(item_data, int):
+            quantities = {"": item_data}
+        else:
+            quantities = item_data["items_by_size"]
+
+        for size, quantity in quantities.items():
+            variant_id = variants.get((int(item_id), size))
+            if variant_id:
+                new_bag[str(variant_id)] = quantity
+
+    return new_bag
+
+
+def upgrade_bag(bag, bag_version):
+    """
+    Return the bag keyed by variant id, converting it
+    if it was saved with an older bag version
+    """
+    if bag and bag_version != BAG_VERSION:
+        return _convert_old_bag(bag)
+    return bag
+
+
+def get_bag(request):
+    """
+    Get the bag from the session, converting it if it's an old bag
+    """
+    bag = request.session.get("bag", {})
+
+    if bag and request.session.get("bag_version") != BAG_VERSION:
+        bag = upgrade_bag(bag, request.session.get("bag_version"))
+        save_bag(request, bag)
+
+    return bag
+
+
+def save_bag(request, bag):
+    """
+    Place the bag dictionary within the session
+    """
+    request.session["bag"] = bag
+    request.session["bag_version"] = BAG_VERSION
+
+
+def resolve_bag(bag):
+    """
+    Return a list of (variant, quantity) tuples for the bag, getting
+    every variant & it's product in a single query.
+    Variants that no longer exist are left out.
+    """
+    variants = ProductVariant.objects.select_related("product").in_bulk(list(bag.keys()))
+
+    return [
+        (variants[int(variant_id)], quantity)
+        for variant_id, quantity in bag.items()
+        if int(variant_id) in variants
+    ]
@@ -1,9 +1,19 @@
 from django.shortcuts import render, redirect, reverse, HttpResponse, get_object_or_404
 from django.contrib import messages
-from products.models import Product
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.views.decorators.cache import never_cache
+from products.models import Product, ProductVariant
+from .contexts import bag_contents
+from .utils import get_bag, save_bag
 
 # Create your views here.
 
+# The bag is a dictionary of {variant id: quantity}
+# A variant is a product in a particular size, products
+# without sizes have a single variant with a blank size
+
 
 def view_bag(request):
     """
@@ -12,6 +22,27 @@ def view_bag(request):
     return render(request, "bag/bag.html")
 
 
+@never_cache
+def bag_summary(request):
+    """
+    Return the parts of a page specific to this visitor as JSON,
+    which are filled in on pages served from the page cache
+    """
+    bag = bag_contents(request)
+
+    # Rendering the toasts marks the messages as shown
+    toasts = ""
+    if len(messages.get_messages(request)):
+        toasts = render_to_string("includes/toasts/messages.html", request=request)
+
+    return JsonResponse({
+        "product_count": bag["product_count"],
+        "grand_total": f'{bag["grand_total"]:.2f}' if bag["grand_total"] else "",
+        "csrf_token": get_token(request),
+        "toasts": toasts,
+    })
+
+
 def add_to_bag(request, item_id):
     """
     Add a quantity pf the specified product to the shopping bag
@@ -36,103 +67,76 @@ def add_to_bag(request, item_id):
     if 'product_size' in request.POST:
         size = request.POST['product_size']
 
+    # Get the variant of the product in this size, products
+    # without sizes have a variant with a blank size
+    variant = get_object_or_404(ProductVariant, product=product, size=size or "")
+    variant_id = str(variant.pk)
 
     # Grab the session bag if it exists
     # Initialise a new dictionary if it doesn't
-    bag = request.session.get("bag", {})
-
-    if size:
-        if item_id in list(bag.keys()):
-            # If the item is already in the bag, check to see if another item of the same id
-            # and same size already exists. If so, increment the quantity for that size
-            if size in bag[item_id]['items_by_size'].keys():
-                bag[item_id]['items_by_size'][size] += quantity
-                # Otherwise, set the amount of this item in a particular size to the quantity,
-                # As this is a new size for that item
-                messages.success(request, f'Updated size {size.upper()} {product.name} quantity to {bag[item_id]["items_by_size"][size]}')
-            else:
-                bag[item_id]['items_by_size'][size] = quantity
-                # Message user that a new size has been added
-                messages.success(request, f'Added size {size.upper()} {product.name} to your bag')
+    bag = get_bag(request)
+
+    # If there's already a key in the bag, that matches
+    # the variant id, increment it accordingly
+    # else give it the amount specified within from request
+    if variant_id in bag:
+        bag[variant_id] += quantity
+        # Send message informing the quantity has been updated
+        if size:
+            messages.success(request, f'Updated size {size.upper()} {product.name} quantity to {bag[variant_id]}')
         else:
-            # If item is not already present within bag, add it to the bag
-            # We're doing it as a dictionary with the key of items_by_size, as we
-            # May have multiple items with this item_id, but different sizes.
-            # This allows us to structure the bags such that we can have a single item_id for each item,
-            #  But still track multiple sizes
-            bag[item_id] = {'items_by_size': {size: quantity}}
-            # Message user that a new size has been added
-            messages.success(request, f'Added size {size.upper()} {product.name} to your bag')
+            messages.success(request, f'Updated {product.name} quantity to {bag[variant_id]}')
     else:
+        bag[variant_id] = quantity
 
-        # If there's already a key in the bag, that matches
-        # the current product id, increment it accordingly
-        # else give it the amount specified within from request
-        if item_id in list(bag.keys()):
-            bag[item_id] += quantity
-            # Send message informing the quantity has been updated
-            messages.success(request, f'Updated {product.name} quantity to {bag[item_id]}')
+        # Add a message to request object, informing the user that the item
+        # Has been added to their bag
+        if size:
+            messages.success(request, f'Added size {size.upper()} {product.name} to your bag')
         else:
-            bag[item_id] = quantity
-
-            # Add a message to request object, informing the user that the item
-            # Has been added to their bag
             messages.success(request, f'Added {product.name} to your bag')
-  
+
     # Place the bag dictionary within the session
-    request.session['bag'] = bag
+    save_bag(request, bag)
 
     return redirect(redirect_url)
 
 
 def adjust_bag(request, item_id):
     """
-    Adjust the quantity of of the specified product to the specified amount
+    Adjust the quantity of of the specified variant to the specified amount
     """
 
-    # Get the product
-    product = get_object_or_404(Product, pk=item_id)
+    # Get the variant & it's product
+    variant = get_object_or_404(ProductVariant.objects.select_related("product"), pk=item_id)
+    product = variant.product
+    size = variant.size
 
     # Get's returned as a string by default, we'll convert
     # it to an integer and store the quantity
     quantity = int(request.POST.get("quantity"))
 
-    # Init's the size to none as some products are only one size
-    size = None
-
-    # If a product size is present within request,
-    # Replace the initial value with the requested one
-    if 'product_size' in request.POST:
-        size = request.POST['product_size']
-
-
     # Grab the session bag if it exists
     # Initialise a new dictionary if it doesn't
-    bag = request.session.get("bag", {})
+    bag = get_bag(request)
+    variant_id = str(variant.pk)
 
-    if size:
-        if quantity > 0:
-            bag[item_id]['items_by_size'][size] = quantity
-            messages.success(request, f'Updated size {size.upper()} {product.name} quantity to {bag[item_id]["items_by_size"][size]}')
+    if quantity > 0:
+        bag[variant_id] = quantity
+        if size:
+            messages.success(request, f'Updated size {size.upper()} {product.name} quantity to {bag[variant_id]}')
         else:
-            del bag[item_id]['items_by_size'][size]
-
-            if not bag[item_id]['items_by_size']:
-                bag.pop(item_id)
-            
-            messages.success(request, f'Removed size {size.upper()} {product.name} from your bag')
-
+            messages.success(request, f'Updated {product.name} quantity to {bag[variant_id]}')
     else:
-        if quantity > 0:
-            bag[item_id] = quantity
-            messages.success(request, f'Updated {product.name} quantity to {bag[item_id]}')
+        bag.pop(variant_id, None)
+        # Inform user that item has been removed from bag
+        if size:
+            messages.success(request, f'Removed size {size.upper()} {product.name} from your bag')
         else:
-            bag.pop(item_id)
-            # Inform user that item has been removed from bag
             messages.success(request, f'Removed {product.name} from your bag')
-  
+
     # Place the bag dictionary within the session
-    request.session['bag'] = bag
+    save_bag(request, bag)
 
     return redirect(reverse('view_bag'))
 
@@ -142,37 +146,25 @@ def remove_from_bag(request, item_id):
     """
 
     try:
-        # Get product
-        product = get_object_or_404(Product, pk=item_id)
-
-        # Init's the size to none as some products are only one size
-        size = None
-
-        # If a product size is present within request,
-        # Replace the initial value with the requested one
-        if 'product_size' in request.POST:
-            size = request.POST['product_size']
-
+        # Get the variant & it's product
+        variant = get_object_or_404(ProductVariant.objects.select_related("product"), pk=item_id)
+        product = variant.product
+        size = variant.size
 
         # Grab the session bag if it exists
         # Initialise a new dictionary if it doesn't
-        bag = request.session.get("bag", {})
+        bag = get_bag(request)
 
-        if size:
-            del bag[item_id]['items_by_size'][size]
+        bag.pop(str(variant.pk))
 
-            if not bag[item_id]['items_by_size']:
-                bag.pop(item_id)
-            
+        # Inform user that item has been removed from bag
+        if size:
             messages.success(request, f'Removed size {size.upper()} {product.name} from your bag')
-
         else:
-            bag.pop(item_id)
-            # Inform user that item has been removed from bag
             messages.success(request, f'Removed {product.name} from your bag')
-    
+
         # Place the bag dictionary within the session
-        request.session['bag'] = bag
+        save_bag(request, bag)
 
         # Instead of a redirect, because this view will be posted to from a javascript function,
         # We want to return an actuall 200 HTTP response, implying that the item was
@@ -182,4 +174,3 @@ def remove_from_bag(request, item_id):
     except Exception as e:
         messages.error(request, f"Error removing item: {e}")
         return HttpResponse(status=500)
-
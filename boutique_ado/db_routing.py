@@ -0,0 +1,140 @@
+"""
+Send read-only traffic to a read replica of the database.
+
+When DATABASE_REPLICA_URL is set, the replica is added to DATABASES as
+REPLICA_DATABASE. Every write goes to the primary ("default") database,
+and reads go to the primary too unless something has opted in to the
+replica. ReplicaRoutingMiddleware opts GET requests in, apart from:
+
+- Paths in PRIMARY_DATABASE_PATHS, i.e checkout (including stripe's
+  webhooks) & the bag, which must always see the latest data
+- Visitors who wrote to the database in the last REPLICA_PIN_SECONDS,
+  who carry a cookie saying so, so they always see their own changes
+  (such as the order they just placed) even if the replica is behind
+
+Management commands & workers read from the primary, unless they use
+use_replica(), as the reporting commands do. Sessions are always read
+from the primary, as they change on almost every request. In-memory
+caches (the category registry & suggestion index) are loaded inside
+use_primary(), so they never keep a copy of a lagging replica.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY_DATABASE = 'default'
+
+# Apps whose tables are always read from the primary
+PRIMARY_APPS = {'sessions'}
+
+PIN_COOKIE_NAME = 'primary_db_pin'
+
+_read_from_replica = contextvars.ContextVar('read_from_replica', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+def replica_database():
+    """
+    The replica's alias, or None if there isn't a replica
+    """
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def use_replica():
+    """
+    Read from the replica inside the with block, e.g for reports
+    """
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the with block, e.g when loading
+    something that's kept in memory, which must not be out of date
+    """
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Route reads to the replica when it's been opted in to,
+    and everything else to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        # Related objects are read from the same database as the object
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        replica = replica_database()
+        if (replica and _read_from_replica.get()
+                and model._meta.app_label not in PRIMARY_APPS):
+            return replica
+        return PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        # Anything read after a write in the same request comes from
+        # the primary, so it includes the write
+        _wrote.set(True)
+        _read_from_replica.set(False)
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so they hold the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets it's tables by copying the primary
+        return db == PRIMARY_DATABASE
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decide whether each request can read from the replica, and pin
+    visitors that write to the primary for a while afterwards
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _can_use_replica(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if request.path.startswith(tuple(settings.PRIMARY_DATABASE_PATHS)):
+            return False
+        return PIN_COOKIE_NAME not in request.COOKIES
+
+    def __call__(self, request):
+        replica_token = _read_from_replica.set(
+            bool(replica_database()) and self._can_use_replica(request))
+        wrote_token = _wrote.set(False)
+
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _read_from_replica.reset(replica_token)
+            _wrote.reset(wrote_token)
+
+        if wrote and replica_database():
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+
+        return response
@@ -0,0 +1,30 @@
+"""
+Migration operations shared by the apps.
+
+The orders tables hold hundreds of thousands of rows, and a plain
+CREATE INDEX blocks writes to a table until the index is built, so
+indexes on them are built with postgres' CREATE INDEX CONCURRENTLY.
+Migrations using these must set atomic = False, as postgres can't
+build an index concurrently inside a transaction.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+from django.db.migrations.operations import AddIndex
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """
+    Add an index concurrently on postgres, or as a normal
+    index on other databases (e.g sqlite in development)
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
@@ -53,6 +53,8 @@ INSTALLED_APPS = [
     'bag',
     'checkout',
     'profiles',
+    'reports',
+    'inventory',
 
     # crispy forms - allows us to format our forms using
     # bootstrap styling
@@ -64,6 +66,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Needs to come before the session middleware, so saving
+    # the session counts as a write to the database
+    'boutique_ado.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,6 +106,9 @@ TEMPLATES = [
 
                 # Making the bag_contents function available throughout app
                 'bag.contexts.bag_contents',
+
+                # Keeps the CSRF token out of pages in the page cache
+                'home.page_cache.csrf_placeholder',
             ],
             "builtins": [
                 # Contains all the tags we want available in
@@ -112,6 +120,19 @@ TEMPLATES = [
     },
 ]
 
+if 'DEVELOPMENT' not in os.environ:
+    # In production, templates are read from disk & compiled once, then
+    # kept in memory by the cached loader. DEBUG being on stops django
+    # from turning this on by itself, so the loaders are set explicitly
+    # Template edits need a restart to show up, so it's left off locally
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 # Tell django to store messages within the session
 # This is often not required as it's the default but due to the use
 # Of gitpod, it's required
@@ -169,6 +190,26 @@ else:
         }
     }
 
+# An optional read replica of the database, used for read only pages
+# & reports. See boutique_ado/db_routing.py for what reads from it
+REPLICA_DATABASE = 'replica'
+
+if 'DATABASE_REPLICA_URL' in os.environ:
+    DATABASES[REPLICA_DATABASE] = dj_database_url.parse(os.environ.get('DATABASE_REPLICA_URL'))
+    # Tests use the primary's test database in place of the replica
+    DATABASES[REPLICA_DATABASE]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['boutique_ado.db_routing.ReplicaRouter']
+
+# These always read from the primary, as they have to see the latest
+# data, e.g the stock & orders in checkout & the webhooks
+PRIMARY_DATABASE_PATHS = ('/checkout/', '/bag/', '/accounts/')
+
+# How long visitors read from the primary after writing to the database,
+# so they see their own changes, which should be longer than the
+# replica takes to catch up
+REPLICA_PIN_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -210,6 +251,9 @@ STATIC_URL = '/static/'
 # tells django where all of our static files are located
 # meant to be tuple, hence being in brackets
 STATICFILES_DIRS = (os.path.join(BASE_DIR, "static"),)
+# Where collectstatic gathers the static files when they're
+# served by whitenoise rather than S3
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
 MEDIA_URL = "/media/"
 # tells django where all of our media files are located
@@ -218,9 +262,11 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 if 'USE_AWS' in os.environ:
 
     # Cache control
-    # This will tell the browser it's okay to cache static files
+    # This will tell the browser it's okay to cache media files
     # As they won't change very often and this will improve
     # Performance for our users
+    # Static files set their own headers in StaticStorage, as they're
+    # named by their contents and can be cached forever
     AWS_S3_OBJECT_PARAMETERS = {
         'Expires': 'Thu, 31 Dec 2099 20:00:00 GMT',
         'CacheControl': 'max-age=94608000',
@@ -235,7 +281,7 @@ if 'USE_AWS' in os.environ:
 
     # Static & media files
     # For static file storage we want to use our
-    # StaticStorage class
+    # StaticStorage class, which hashes & gzips them
     STATICFILES_STORAGE = 'custom_storage.StaticStorage'
 
     # The location django should save to is a folder
@@ -254,6 +300,23 @@ if 'USE_AWS' in os.environ:
     STATIC_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{STATICFILES_LOCATION}/'
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{MEDIAFILES_LOCATION}/'
 
+elif 'USE_WHITENOISE' in os.environ:
+
+    # Without S3, static files can be served by whitenoise from STATIC_ROOT
+    # Set USE_WHITENOISE once collectstatic has been run, as every page
+    # links to the hashed names listed in collectstatic's manifest
+    # collectstatic saves hashed, gzipped & brotli compressed copies
+    # of each file, so repeat visitors never download them again
+    STATICFILES_STORAGE = 'custom_storage.LocalStaticStorage'
+
+    # Whitenoise needs to come straight after the security middleware
+    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+
+    # DEBUG is on, which would have whitenoise rescan the files on each
+    # request & look for them outside of STATIC_ROOT, so turn that off
+    WHITENOISE_AUTOREFRESH = False
+    WHITENOISE_USE_FINDERS = False
+
 # Stripe
 FREE_DELIVERY_THRESHOLD = 50
 STANDARD_DELIVERY_PERCENTAGE = 10
@@ -272,6 +335,47 @@ STRIPE_WH_SECRET = os.environ.get("STRIPE_WH_SECRET")
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
 
+# All calls to stripe go through this client class (see checkout/stripe_client.py)
+# It can be swapped for 'checkout.stripe_client.FakeStripeClient' in tests
+STRIPE_CLIENT = os.environ.get('STRIPE_CLIENT', 'checkout.stripe_client.StripeClient')
+
+# Seconds to wait for a connection to stripe & for its response
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get('STRIPE_CONNECT_TIMEOUT', 3))
+STRIPE_READ_TIMEOUT = float(os.environ.get('STRIPE_READ_TIMEOUT', 10))
+
+# How many times a failed network call to stripe is retried
+STRIPE_MAX_NETWORK_RETRIES = int(os.environ.get('STRIPE_MAX_NETWORK_RETRIES', 2))
+
+# Max number of keep-alive connections to stripe held per process
+STRIPE_HTTP_POOL_SIZE = int(os.environ.get('STRIPE_HTTP_POOL_SIZE', 10))
+
+# Webhooks are queued & processed by the process_webhooks command
+# Set STRIPE_WH_INLINE to handle them within the webhook request instead
+STRIPE_WH_QUEUE = 'STRIPE_WH_INLINE' not in os.environ
+
+# Queued webhooks are retried this many times, waiting between the base
+# & max delay (in seconds), doubling each time
+STRIPE_WH_QUEUE_MAX_ATTEMPTS = 8
+STRIPE_WH_QUEUE_RETRY_BASE_DELAY = 5
+STRIPE_WH_QUEUE_RETRY_MAX_DELAY = 600
+
+# Seconds before an event held by a worker that has stopped is picked up again
+STRIPE_WH_QUEUE_VISIBILITY_TIMEOUT = 300
+
+# Minutes stock is held for a checkout while the customer pays, before the
+# release_expired_reservations command puts it back
+STOCK_RESERVATION_MINUTES = 30
+
+# Days a pending checkout that was never paid for is kept before the
+# release_expired_reservations command deletes it. Stripe retries
+# webhooks for up to 3 days, so this is comfortably longer
+PENDING_CHECKOUT_DAYS = 7
+
+# How long catalog pages are kept in the page cache for anonymous
+# visitors. Catalog changes clear them in the process that made the
+# change, other processes keep serving their copy for up to this long
+PAGE_CACHE_SECONDS = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,105 @@
+from unittest import mock, skipUnless
+
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from home.page_cache import clear_page_cache
+from products.categories import clear_categories, get_categories
+from products.models import Product, ProductVariant
+from products.suggest import clear_index, get_index
+
+from .db_routing import PIN_COOKIE_NAME, PRIMARY_DATABASE, replica_database
+
+REPLICA_DATABASE = replica_database()
+
+
+# The replica is only set up when DATABASE_REPLICA_URL is set, e.g
+# DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 python manage.py test
+# Its TEST MIRROR setting makes it use the primary's test database,
+# so both aliases see the same rows & the test only checks which
+# connection each query went to
+@skipUnless(REPLICA_DATABASE, 'DATABASE_REPLICA_URL is not set')
+@override_settings(
+    STRIPE_PUBLIC_KEY='pk_test',
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {PRIMARY_DATABASE, REPLICA_DATABASE or PRIMARY_DATABASE}
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Test product', description='A product', price=10)
+        self.variant, _ = ProductVariant.objects.get_or_create(
+            product=self.product, size='')
+        # Make sure the catalog pages are rendered, not served from the cache
+        clear_page_cache()
+        # Load the in-memory caches up front, so pages only
+        # run the queries they run on every request
+        clear_categories()
+        clear_index()
+        get_categories()
+        get_index()
+
+    def _get(self, path):
+        """
+        Request a page, returning the response & how many
+        queries ran on the primary & the replica
+        """
+        with CaptureQueriesContext(connections[PRIMARY_DATABASE]) as primary, \
+                CaptureQueriesContext(connections[REPLICA_DATABASE]) as replica:
+            response = self.client.get(path)
+        return response, len(primary), len(replica)
+
+    def test_catalog_reads_from_the_replica(self):
+        response, primary, replica = self._get(reverse('products'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+
+    def test_checkout_reads_from_the_primary(self):
+        self.client.post(reverse('add_to_bag', args=[self.product.pk]), {
+            'quantity': 1, 'redirect_url': '/'})
+        # Forget the pin from adding to the bag, so only
+        # the checkout path keeps reads on the primary
+        del self.client.cookies[PIN_COOKIE_NAME]
+
+        stripe_client = mock.Mock()
+        stripe_client.create_payment_intent.return_value = mock.Mock(
+            id='pi_test', client_secret='pi_test_secret')
+        with mock.patch('checkout.views.get_stripe_client', return_value=stripe_client):
+            response, primary, replica = self._get(reverse('checkout'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_writes_pin_the_visitor_to_the_primary(self):
+        response = self.client.post(reverse('add_to_bag', args=[self.product.pk]), {
+            'quantity': 1, 'redirect_url': '/'})
+
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME].value, '1')
+
+        response, primary, replica = self._get(reverse('products'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_in_memory_caches_load_from_the_primary(self):
+        clear_categories()
+
+        with CaptureQueriesContext(connections[PRIMARY_DATABASE]) as primary, \
+                CaptureQueriesContext(connections[REPLICA_DATABASE]) as replica:
+            response = self.client.get(reverse('products'))
+
+        self.assertEqual(response.status_code, 200)
+        # The page itself is read from the replica, but the categories
+        # it's going to keep for minutes come from the primary
+        self.assertGreater(len(replica), 0)
+        self.assertTrue(any('products_category' in query['sql']
+                            for query in primary.captured_queries))
+        self.assertFalse(any('FROM "products_category"' in query['sql']
+                             for query in replica.captured_queries))
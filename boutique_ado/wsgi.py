@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'boutique_ado.settings')
 
 application = get_wsgi_application()
+
+# Compile every template before serving the first request, so
+# the cached template loader already has them in production
+if 'DEVELOPMENT' not in os.environ:
+    from home.templates_warmup import warm_templates
+    warm_templates()
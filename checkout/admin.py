@@ -1,6 +1,60 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 # Importing order and orderlineitem models
-from .models import Order, OrderLineItem
+from .models import ArchivedOrder, ArchivedOrderLineItem, Order, OrderLineItem, WebhookEvent
+from .exports import export_response
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counting every row of a huge table is slow on postgres, so
+    when the list isn't filtered we use postgres' estimate of the
+    number of rows instead
+    """
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        # The list may be read from the replica, so ask
+        # the database the list is being read from
+        connection = connections[getattr(self.object_list, 'db', DEFAULT_DB_ALIAS)]
+        if connection.vendor == 'postgresql' and query is not None and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [query.model._meta.db_table])
+                row = cursor.fetchone()
+            # The estimate isn't worth using on small tables,
+            # or if the table hasn't been analyzed yet
+            if row and row[0] > 10000:
+                return int(row[0])
+        return super().count
+
+
+class IndexedSearchMixin:
+    """
+    Django's admin searches = fields with iexact, which compares
+    UPPER(field) on postgres, so it can't use the field's index.
+    Order numbers & payment intent ids are always typed exactly, so
+    this searches them with the exact lookup instead, which can.
+    ^ fields are still searched case insensitively with istartswith,
+    which the UPPER(...) indexes from checkout migration 0011 serve.
+    """
+    search_lookups = {'=': 'exact', '^': 'istartswith'}
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        query = Q()
+        for field in self.get_search_fields(request):
+            lookup = self.search_lookups.get(field[0], 'icontains')
+            query |= Q(**{f'{field.lstrip("=^")}__{lookup}': search_term})
+
+        return queryset.filter(query), False
+
 
 # Inherits from tabularinline
 class OrderLineItemAdminInline(admin.TabularInline):
@@ -11,8 +65,22 @@ class OrderLineItemAdminInline(admin.TabularInline):
     # Make line item total read-only
     readonly_fields = ('lineitem_total',)
 
+    # Search for products instead of rendering every product
+    # in a select box for each line item
+    autocomplete_fields = ('product',)
+
+    # Variants are entered by their id for the same reason
+    raw_id_fields = ('variant',)
+
+    # Don't add empty line items to the order page
+    extra = 0
+
+    def get_queryset(self, request):
+        # Each line item shows it's product, so get them in the same query
+        return super().get_queryset(request).select_related('product')
+
 
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(IndexedSearchMixin, admin.ModelAdmin):
     # Add line item as an inline item for orderadmin class
     inlines = (OrderLineItemAdminInline,)
 
@@ -33,13 +101,110 @@ class OrderAdmin(admin.ModelAdmin):
 
     # Restrict the columns that show up in the order to only a few key items
     list_display = ('order_number', 'date', 'full_name',
-                    'order_total', 'delivery_cost',
+                    'user_profile', 'order_total', 'delivery_cost',
                     'grand_total',)
 
+    # Get each order's profile & user in the same query as the orders
+    list_select_related = ('user_profile__user',)
+
+    # Drill down into orders by year, month & day
+    date_hierarchy = 'date'
+
+    # = is an exact match & ^ matches the start of the field, ignoring
+    # case. Both can use an index (see IndexedSearchMixin), unlike a
+    # contains search
+    search_fields = ('=order_number', '=stripe_pid', '^email', '^full_name')
+
+    # Don't count every order in the table on each page,
+    # and estimate the count on huge tables
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
     # The items will be ordered by date in reverse, placing most recent orders at the top
     ordering = ('-date',)
 
+    # Let finance download the selected orders for accounting
+    actions = ('export_as_csv', 'export_as_jsonl')
+
+    @admin.action(description='Export selected orders as CSV')
+    def export_as_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+
+    @admin.action(description='Export selected orders as JSON lines')
+    def export_as_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+
 # Register Order & OrderAdmin model
 # We're not going to register the OrderLineItem model, since
 # It's accessible via the inline within the order model
-admin.site.register(Order, OrderAdmin)
\ No newline at end of file
+admin.site.register(Order, OrderAdmin)
+
+
+class ArchivedOrderLineItemAdminInline(admin.TabularInline):
+    model = ArchivedOrderLineItem
+    fields = ('product', 'variant', 'product_size', 'quantity', 'lineitem_total')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product', 'variant')
+
+
+class ArchivedOrderAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    # Archived orders are kept as they were, so they can be looked
+    # at & exported but not changed
+    inlines = (ArchivedOrderLineItemAdminInline,)
+
+    fields = ('order_number', 'user_profile', 'date', 'full_name',
+              'email', 'phone_number', 'country',
+              'postcode', 'town_or_city', 'street_address1',
+              'street_address2', 'county', 'delivery_cost',
+              'order_total', 'grand_total', "original_bag", "stripe_pid",
+              'archived_at')
+    readonly_fields = fields
+
+    list_display = ('order_number', 'date', 'full_name',
+                    'user_profile', 'grand_total', 'archived_at')
+    list_select_related = ('user_profile__user',)
+    date_hierarchy = 'date'
+    search_fields = ('=order_number', '=stripe_pid', '^email', '^full_name')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    ordering = ('-date',)
+
+    actions = ('export_as_csv', 'export_as_jsonl')
+
+    @admin.action(description='Export selected orders as CSV')
+    def export_as_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+
+    @admin.action(description='Export selected orders as JSON lines')
+    def export_as_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
+
+class WebhookEventAdmin(admin.ModelAdmin):
+    # Show where each queued webhook is up to, so failed
+    # events can be found & looked into
+    list_display = ('stripe_event_id', 'event_type', 'status',
+                    'attempts', 'next_attempt_at', 'created')
+
+    list_filter = ('status', 'event_type')
+
+    readonly_fields = ('stripe_event_id', 'event_type', 'payload',
+                       'attempts', 'locked_at', 'last_error', 'created')
+
+    ordering = ('-created',)
+
+admin.site.register(WebhookEvent, WebhookEventAdmin)
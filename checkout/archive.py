@@ -0,0 +1,116 @@
+"""
+Move old orders out of the order & line item tables into the archive.
+
+Orders are only ever added to the order tables, so every lookup, the
+admin's list of orders & their indexes get slower as the shop gets
+older. Orders placed more than a year or so ago are finished with, so
+the archive_orders management command moves them (and their line items)
+into ArchivedOrder & ArchivedOrderLineItem, a batch at a time, keeping
+the order tables to the orders that are still being worked on.
+
+Archived orders keep their id, order number & fields, so get_order &
+get_profile_orders find an order whichever table it's in.
+"""
+from django.db import connection, transaction
+
+from inventory.models import StockReservation
+
+from .models import ArchivedOrder, ArchivedOrderLineItem, Order, OrderLineItem
+from .signals import freeze_order_totals
+
+# The fields copied across, the archive has the same names for them
+ORDER_FIELDS = [
+    field.attname for field in Order._meta.concrete_fields
+]
+LINEITEM_FIELDS = [
+    field.attname for field in OrderLineItem._meta.concrete_fields
+]
+
+
+def archivable_orders(before):
+    """
+    The orders placed before the given date that can be archived,
+    leaving any whose stock is still held while the payment goes through
+    """
+    held = StockReservation.objects.filter(
+        status=StockReservation.HELD).values('stripe_pid')
+    return Order.objects.filter(date__lt=before).exclude(stripe_pid__in=held)
+
+
+def _archive_batch(before, batch_size):
+    """
+    Move one batch of old orders into the archive, returning
+    how many orders & line items were moved
+    """
+    with transaction.atomic():
+        orders = archivable_orders(before).order_by('pk')
+        # Lock the batch, skipping orders another archiver has
+        # already locked on databases that support it
+        if connection.features.has_select_for_update_skip_locked:
+            orders = orders.select_for_update(skip_locked=True)
+        order_ids = list(orders.values_list('pk', flat=True)[:batch_size])
+        if not order_ids:
+            return 0, 0
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(**values)
+            for values in Order.objects.filter(pk__in=order_ids).values(*ORDER_FIELDS)
+        ])
+        lineitems = [
+            ArchivedOrderLineItem(**values)
+            for values in OrderLineItem.objects.filter(
+                order_id__in=order_ids).values(*LINEITEM_FIELDS)
+        ]
+        ArchivedOrderLineItem.objects.bulk_create(lineitems, batch_size=1000)
+
+        # The orders are going, so there's no point keeping
+        # their totals up to date as the line items are deleted
+        with freeze_order_totals():
+            Order.objects.filter(pk__in=order_ids).delete()
+
+    return len(order_ids), len(lineitems)
+
+
+def archive_orders(before, batch_size=500, progress=None):
+    """
+    Move every order placed before the given date into the archive,
+    batch_size orders per transaction so the order tables are never
+    locked for long. progress is called with the running totals after
+    each batch. Returns how many orders & line items were moved.
+    """
+    archived_orders = archived_lineitems = 0
+    while True:
+        orders, lineitems = _archive_batch(before, batch_size)
+        if not orders:
+            break
+        archived_orders += orders
+        archived_lineitems += lineitems
+        if progress:
+            progress(archived_orders, archived_lineitems)
+    return archived_orders, archived_lineitems
+
+
+def get_order(order_number):
+    """
+    Find an order by it's number, whether it's been archived or not.
+    Raises Order.DoesNotExist if there isn't one.
+    """
+    order = Order.objects.filter(order_number=order_number).first()
+    if order is None:
+        order = ArchivedOrder.objects.filter(order_number=order_number).first()
+    if order is None:
+        raise Order.DoesNotExist(f'No order numbered {order_number}')
+    return order
+
+
+def get_profile_orders(profile):
+    """
+    Every order a profile has placed, archived or not, newest first
+    """
+    # Each order lists it's line items' products, so they're fetched
+    # in a query per table instead of a query per order
+    orders = (
+        list(profile.orders.prefetch_related('lineitems__product'))
+        + list(profile.archived_orders.prefetch_related('lineitems__product'))
+    )
+    return sorted(orders, key=lambda order: order.date, reverse=True)
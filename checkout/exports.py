@@ -0,0 +1,170 @@
+"""
+Stream orders & their line items out as CSV or JSON lines.
+
+Orders and line items are read with iterator(), which uses server-side
+cursors where the database supports them, so only one chunk of rows is
+held in memory at a time no matter how many orders are exported.
+
+Orders can be exported from the order tables, the archive (see
+checkout.archive) or both, so exports that go back far enough still
+include the orders that have been archived.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderLineItem, Order, OrderLineItem
+
+# The original_bag isn't exported, as the line items hold the same information
+ORDER_FIELDS = (
+    'order_number', 'date', 'full_name', 'email', 'phone_number',
+    'country', 'postcode', 'town_or_city', 'street_address1',
+    'street_address2', 'county', 'delivery_cost', 'order_total',
+    'grand_total', 'stripe_pid',
+)
+
+LINEITEM_FIELDS = (
+    'product__sku', 'product__name', 'product_size',
+    'quantity', 'lineitem_total',
+)
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# The line items table for each orders table
+LINEITEM_MODELS = {
+    Order: OrderLineItem,
+    ArchivedOrder: ArchivedOrderLineItem,
+}
+
+
+def filter_by_date(orders, start=None, end=None):
+    """
+    Only include orders placed between two dates (inclusive)
+    """
+    if start:
+        orders = orders.filter(
+            date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        orders = orders.filter(
+            date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return orders
+
+
+def orders_between(start=None, end=None):
+    """
+    The archived & current orders placed between two dates (inclusive).
+    Every archived order is older than the current ones, so the
+    archive comes first to keep the export in date order.
+    """
+    return [
+        filter_by_date(ArchivedOrder.objects.all(), start, end),
+        filter_by_date(Order.objects.all(), start, end),
+    ]
+
+
+def _iter_queryset(orders, chunk_size):
+    """
+    Yield each order in one orders table as a dict, with a list of it's
+    line items. The orders & line items are read side by side in order
+    id order, so they can be matched up without holding either in memory.
+    """
+    order_rows = (
+        orders.order_by('pk')
+        .values('pk', *ORDER_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    lineitem_rows = (
+        LINEITEM_MODELS[orders.model].objects.filter(order__in=orders.values('pk'))
+        .order_by('order_id', 'pk')
+        .values('order_id', *LINEITEM_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    lineitem = next(lineitem_rows, None)
+    for order in order_rows:
+        order_id = order.pop('pk')
+        order['lineitems'] = []
+
+        # Take every line item belonging to this order
+        while lineitem is not None and lineitem['order_id'] <= order_id:
+            if lineitem['order_id'] == order_id:
+                lineitem.pop('order_id')
+                order['lineitems'].append(lineitem)
+            lineitem = next(lineitem_rows, None)
+
+        yield order
+
+
+def iter_orders(orders, chunk_size=2000):
+    """
+    Yield each order as a dict, with a list of it's line items.
+    orders is a queryset of orders or archived orders, or a list of
+    them (see orders_between) which are exported one after the other.
+    """
+    if not isinstance(orders, (list, tuple)):
+        orders = [orders]
+    for queryset in orders:
+        yield from _iter_queryset(queryset, chunk_size)
+
+
+class Echo:
+    """
+    An object that implements just the write method of the file-like
+    interface, so the csv writer hands back each row instead of storing it
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(orders, chunk_size=2000):
+    """
+    Yield the export as CSV lines, with one row for each line item
+    Orders without line items still get a row of their own
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_FIELDS + LINEITEM_FIELDS)
+
+    for order in iter_orders(orders, chunk_size):
+        order_values = [order[field] for field in ORDER_FIELDS]
+        lineitems = order['lineitems'] or [dict.fromkeys(LINEITEM_FIELDS, '')]
+        for lineitem in lineitems:
+            yield writer.writerow(
+                order_values + [lineitem[field] for field in LINEITEM_FIELDS])
+
+
+def iter_jsonl(orders, chunk_size=2000):
+    """
+    Yield the export as JSON lines, with one line for each order
+    """
+    for order in iter_orders(orders, chunk_size):
+        yield json.dumps(order, cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_export(orders, export_format, chunk_size=2000):
+    """
+    Yield the export in the given format
+    """
+    if export_format == 'jsonl':
+        return iter_jsonl(orders, chunk_size)
+    return iter_csv(orders, chunk_size)
+
+
+def export_response(orders, export_format):
+    """
+    Return a streaming response that downloads the export
+    """
+    content_types = {
+        'csv': 'text/csv',
+        'jsonl': 'application/x-ndjson',
+    }
+    response = StreamingHttpResponse(
+        iter_export(orders, export_format),
+        content_type=content_types[export_format],
+    )
+    filename = f'orders-{timezone.now():%Y%m%d-%H%M%S}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
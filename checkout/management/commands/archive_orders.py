@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from checkout.archive import archivable_orders, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move old orders & their line items into the order archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Archive orders placed more than this many days ago')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of orders moved in each transaction')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report how many orders would be archived without moving them')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        before = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = archivable_orders(before).count()
+            self.stdout.write(f'{count} orders placed before {before:%Y-%m-%d} would be archived')
+            return
+
+        def progress(orders, lineitems):
+            self.stdout.write(f'Archived {orders} orders ({lineitems} line items)')
+
+        orders, lineitems = archive_orders(before, options['batch_size'], progress)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {orders} orders & {lineitems} line items '
+            f'placed before {before:%Y-%m-%d}'))
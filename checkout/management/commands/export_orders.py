@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from boutique_ado.db_routing import use_replica
+from checkout.exports import EXPORT_FORMATS, iter_export, orders_between
+
+
+class Command(BaseCommand):
+    help = 'Export orders & their line items as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--start', help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to export (YYYY-MM-DD)')
+        parser.add_argument(
+            '--output', help='File to write to, defaults to standard output')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of rows fetched from the database at a time')
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'{value} is not a date in the form YYYY-MM-DD')
+        return parsed
+
+    def handle(self, *args, **options):
+        # Includes the archived orders, so older date ranges aren't missing any
+        orders = orders_between(self._parse_date(options['start']),
+                                self._parse_date(options['end']))
+
+        # Exports only read, so they can use the read replica
+        with use_replica():
+            rows = iter_export(orders, options['format'], options['chunk_size'])
+
+            if options['output']:
+                # newline='' stops the csv's line endings being changed
+                with open(options['output'], 'w', newline='') as output:
+                    output.writelines(rows)
+            else:
+                sys.stdout.writelines(rows)
@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from checkout.webhook_queue import claim_events, process_event
+
+
+def _process(webhook_event):
+    """
+    Process a single event in a worker thread
+    Each thread has it's own database connection, which is
+    closed if it's no longer usable
+    """
+    close_old_connections()
+    try:
+        return process_event(webhook_event)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Process queued stripe webhook events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Number of events to process at the same time')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process the events that are due and then exit')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                # Claim enough events to keep every thread busy
+                events = claim_events(concurrency)
+
+                if events:
+                    results = list(executor.map(_process, events))
+                    self.stdout.write(
+                        f'Processed {len(results)} events, '
+                        f'{results.count(False)} to retry or failed')
+                    continue
+
+                if options['once']:
+                    break
+
+                time.sleep(options['poll_interval'])
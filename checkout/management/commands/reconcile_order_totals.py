@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from checkout.models import Order
+
+
+class Command(BaseCommand):
+    help = ('Check every order\'s totals against the sum of it\'s line items '
+            'and repair any that have drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of orders to check at a time')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted orders without repairing them')
+
+    def _check_batch(self, order_ids, dry_run):
+        """
+        Check a batch of orders' totals against the sum of their line
+        items, summed in a single grouped query, repairing any that have
+        drifted. Returns how many had drifted.
+        """
+        batch = (
+            Order.objects.filter(pk__in=order_ids)
+            .annotate(lineitems_sum=Coalesce(
+                Sum('lineitems__lineitem_total'),
+                Value(0),
+                output_field=DecimalField(max_digits=10, decimal_places=2)))
+            .only('pk', 'order_number', 'order_total',
+                  'delivery_cost', 'grand_total')
+        )
+
+        to_repair = []
+        for order in batch:
+            order_total = order.lineitems_sum
+            delivery_cost = Order.calculate_delivery_cost(order_total)
+            grand_total = order_total + delivery_cost
+
+            # Compare at the precision the database stores
+            expected = [round(order_total, 2), round(delivery_cost, 2), round(grand_total, 2)]
+            actual = [order.order_total, order.delivery_cost, order.grand_total]
+            if expected == actual:
+                continue
+
+            self.stdout.write(
+                f'Order {order.order_number}: totals {actual} '
+                f'should be {expected}')
+            order.order_total, order.delivery_cost, order.grand_total = expected
+            to_repair.append(order)
+
+        if to_repair and not dry_run:
+            Order.objects.bulk_update(
+                to_repair, ['order_total', 'delivery_cost', 'grand_total'])
+
+        return len(to_repair)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = 0
+        drifted = 0
+        last_pk = 0
+
+        while True:
+            # Each batch is checked & repaired in one transaction
+            with transaction.atomic():
+                orders = Order.objects.filter(pk__gt=last_pk).order_by('pk')
+                # Lock the batch before summing it's line items. A line
+                # item saved meanwhile waits to update it's order's total
+                # until we're done, so the sum we write back can't
+                # overwrite the change it makes
+                if not options['dry_run']:
+                    orders = orders.select_for_update()
+                order_ids = list(orders.values_list('pk', flat=True)[:batch_size])
+                if not order_ids:
+                    break
+
+                last_pk = order_ids[-1]
+                checked += len(order_ids)
+                drifted += self._check_batch(order_ids, options['dry_run'])
+
+        action = 'found' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} orders, {action} {drifted} with drifted totals'))
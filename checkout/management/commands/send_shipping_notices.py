@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from checkout.exports import filter_by_date
+from checkout.models import ArchivedOrder, Order
+from checkout.notifications import send_bulk
+
+
+class Command(BaseCommand):
+    help = 'Email customers that their orders have shipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'order_numbers', nargs='*',
+            help='Orders to send notices for, defaults to every order in the date range')
+        parser.add_argument('--start', help='First day of orders to notify (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day of orders to notify (YYYY-MM-DD)')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of emails sent over a connection before reporting progress')
+        parser.add_argument(
+            '--resend', action='store_true',
+            help='Email orders that have already been sent a shipping notice again')
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'{value} is not a date in the form YYYY-MM-DD')
+        return parsed
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        start = self._parse_date(options['start'])
+        end = self._parse_date(options['end'])
+        if not (options['order_numbers'] or start or end):
+            raise CommandError('Give some order numbers or a --start/--end date range')
+
+        orders = filter_by_date(Order.objects.order_by('pk'), start, end)
+        archived = filter_by_date(ArchivedOrder.objects.all(), start, end)
+        if options['order_numbers']:
+            orders = orders.filter(order_number__in=options['order_numbers'])
+            archived = archived.filter(order_number__in=options['order_numbers'])
+
+        # Archived orders shipped long ago, so rather than quietly
+        # leaving them out, refuse to send anything
+        if archived.exists():
+            raise CommandError(
+                'Some of these orders have been archived, so they have already '
+                'shipped. Give a later --start date or leave their order numbers out')
+
+        # Orders that have been notified already are skipped, so
+        # running the command again only emails the rest
+        if not options['resend']:
+            orders = orders.filter(shipping_notice_sent_at__isnull=True)
+
+        def record_sent(sent_orders):
+            Order.objects.filter(pk__in=[order.pk for order in sent_orders]).update(
+                shipping_notice_sent_at=timezone.now())
+
+        def progress(stats):
+            self.stdout.write(
+                f"Sent {stats['sent']} ({stats['failed']} failed), "
+                f"{stats['per_second']:.0f} emails/s")
+
+        stats = send_bulk(orders, 'shipping', options['batch_size'], progress, record_sent)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {stats['sent']} shipping notices in {stats['seconds']:.1f}s "
+            f"({stats['per_second']:.0f} emails/s), {stats['failed']} failed"))
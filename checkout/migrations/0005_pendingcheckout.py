@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-19 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0004_order_user_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingCheckout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stripe_pid', models.CharField(max_length=254, unique=True)),
+                ('bag', models.TextField(default='')),
+                ('username', models.CharField(max_length=150)),
+                ('save_info', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-19 14:17
+
+from django.db import migrations, models
+
+from boutique_ado.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # The indexes are built concurrently on postgres, so writes
+    # to the orders table aren't blocked while they're built,
+    # which can't be done inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('checkout', '0006_auto_20261019_1414'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['order_number'], name='order_number_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['date'], name='order_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['stripe_pid'], name='order_stripe_pid_idx'),
+        ),
+    ]
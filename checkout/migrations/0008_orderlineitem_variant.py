@@ -0,0 +1,40 @@
+# Generated by Django 3.2 on 2026-10-19 14:20
+
+from django.db import migrations, models
+from django.db.models import Q
+import django.db.models.deletion
+
+
+def set_lineitem_variants(apps, schema_editor):
+    """
+    Point existing line items at the variant matching their product & size
+    """
+    OrderLineItem = apps.get_model('checkout', 'OrderLineItem')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+
+    for variant in ProductVariant.objects.iterator():
+        if variant.size:
+            same_size = Q(product_size=variant.size)
+        else:
+            same_size = Q(product_size__isnull=True) | Q(product_size='')
+
+        OrderLineItem.objects.filter(
+            same_size, product_id=variant.product_id, variant__isnull=True,
+        ).update(variant=variant)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_create_product_variants'),
+        ('checkout', '0007_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderlineitem',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.productvariant'),
+        ),
+        migrations.RunPython(set_lineitem_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2 on 2026-10-19 14:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_countries.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0001_initial'),
+        ('products', '0006_catalogversion'),
+        ('checkout', '0008_orderlineitem_variant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(editable=False, max_length=32, unique=True)),
+                ('full_name', models.CharField(max_length=50)),
+                ('email', models.EmailField(max_length=254)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('country', django_countries.fields.CountryField(max_length=2)),
+                ('postcode', models.CharField(blank=True, max_length=20, null=True)),
+                ('town_or_city', models.CharField(max_length=40)),
+                ('street_address1', models.CharField(max_length=80)),
+                ('street_address2', models.CharField(blank=True, max_length=80, null=True)),
+                ('county', models.CharField(blank=True, max_length=80, null=True)),
+                ('date', models.DateTimeField(db_index=True)),
+                ('delivery_cost', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('order_total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('original_bag', models.TextField(default='')),
+                ('stripe_pid', models.CharField(db_index=True, default='', max_length=254)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user_profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='profiles.userprofile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderLineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_size', models.CharField(blank=True, max_length=2, null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('lineitem_total', models.DecimalField(decimal_places=2, editable=False, max_digits=6)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineitems', to='checkout.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.productvariant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0009_archivedorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingcheckout',
+            name='bag_version',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2 on 2026-10-19 14:44
+
+from django.db import migrations
+
+# The admin searches the email & name with istartswith, which is
+# UPPER(column::text) LIKE UPPER('abc%') on postgres. An index on
+# that expression with text_pattern_ops can serve it whatever the
+# database's collation. Django 3.2 can't give an expression index an
+# operator class, so these are created with SQL, and only on postgres
+# (sqlite's LIKE can't use an index like this anyway)
+SEARCH_INDEXES = [
+    ('order_email_upper_idx', 'checkout_order', 'email'),
+    ('order_full_name_upper_idx', 'checkout_order', 'full_name'),
+    ('archivedorder_email_upper_idx', 'checkout_archivedorder', 'email'),
+    ('archivedorder_full_name_upper_idx', 'checkout_archivedorder', 'full_name'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON {table} (UPPER({column}::text) text_pattern_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    # Built concurrently so writes to the orders aren't blocked,
+    # which can't be done inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('checkout', '0010_pendingcheckout_bag_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
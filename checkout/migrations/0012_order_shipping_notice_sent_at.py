@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0011_order_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='shipping_notice_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='shipping_notice_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,12 +1,15 @@
 import uuid
+from datetime import timedelta
 
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import F, Sum
 from django.conf import settings
+from django.utils import timezone
 
 from django_countries.fields import CountryField
 
-from products.models import Product
+from products.models import Product, ProductVariant
+from bag.utils import resolve_bag
 from profiles.models import UserProfile
 
 # Flow of these models
@@ -18,6 +21,19 @@ from profiles.models import UserProfile
 
 class Order(models.Model):
 
+    class Meta:
+        # Orders are looked up by their number & stripe's payment intent
+        # id, and listed & filtered by date. The indexes are named so
+        # their migration can build them concurrently, see
+        # boutique_ado.migration_operations
+        # The admin's case insensitive searches of the email & name use
+        # UPPER(...) indexes, which are created in migration 0011
+        indexes = [
+            models.Index(fields=['order_number'], name='order_number_idx'),
+            models.Index(fields=['date'], name='order_date_idx'),
+            models.Index(fields=['stripe_pid'], name='order_stripe_pid_idx'),
+        ]
+
     # editable = false is self explanatory - this will be a unique & permanent no.
     # so it cannot be edited
     order_number = models.CharField(max_length=32, null=False, editable=False)
@@ -66,6 +82,10 @@ class Order(models.Model):
     # Contains the stripe payment intent ID which is guarunteed to be unique
     stripe_pid = models.CharField(max_length=254, null=False, blank=False, default="")
 
+    # When the customer was emailed that their order has shipped, so
+    # running send_shipping_notices again doesn't email them twice
+    shipping_notice_sent_at = models.DateTimeField(null=True, blank=True)
+
     # prepended with _ to indicate it's a private method that'll
     # only be used inside this class
     def _generate_order_number(self):
@@ -74,10 +94,26 @@ class Order(models.Model):
         """
         return uuid.uuid4().hex.upper()
 
+    @staticmethod
+    def calculate_delivery_cost(order_total):
+        """
+        Return the delivery cost for an order total
+        """
+        # With order total calculated, we can then calculate the delivery cost
+        if order_total < settings.FREE_DELIVERY_THRESHOLD:
+            # If the order total is under the threshold, the delivery cost is the total multiplied
+            # by standard delivery percentage
+            return order_total * settings.STANDARD_DELIVERY_PERCENTAGE / 100
+
+        # If the order total is over the threshold, the delivery cost is 0
+        return 0
+
     def update_total(self):
         """
-        Update grand total each time a line item is added,
+        Recalculate the order total from all of it's line items,
         accounting for delivery costs.
+        Line item changes use apply_lineitem_change instead, this is
+        used when line items are bulk created & to repair totals.
         """
         # By using the sum function across all the lineitem total fields
         # for all line items within this order
@@ -88,14 +124,7 @@ class Order(models.Model):
         # attempt to see if delivery threshold is less than none, which isn't good
         self.order_total = self.lineitems.aggregate(Sum('lineitem_total'))['lineitem_total__sum'] or 0
 
-        # With order total calculated, we can then calculate the delivery cost
-        if self.order_total < settings.FREE_DELIVERY_THRESHOLD:
-            # If the order total is under the threshold, the delivery cost is the total multiplied
-            # by standard delivery percentage
-            self.delivery_cost = self.order_total * settings.STANDARD_DELIVERY_PERCENTAGE / 100
-        else:
-            # If the order total is over the threshold, the delivery cost is 0
-            self.delivery_cost = 0
+        self.delivery_cost = self.calculate_delivery_cost(self.order_total)
 
         # Determine grand total by adding delivery cost & order total together
         self.grand_total = self.order_total + self.delivery_cost
@@ -103,6 +132,55 @@ class Order(models.Model):
         # Save the order instance
         self.save()
 
+    def add_lineitems_from_bag(self, bag):
+        """
+        Create a line item for each variant in the bag.
+        The variants & their products are fetched in a single query
+        and the line items are inserted at once, updating the
+        order's totals a single time.
+        """
+        lines = resolve_bag(bag)
+        if len(lines) != len(bag):
+            raise ProductVariant.DoesNotExist("A product in the bag no longer exists")
+
+        # bulk_create doesn't call the line item's save method or send
+        # the signals, so the line item totals are calculated here
+        OrderLineItem.objects.bulk_create([
+            OrderLineItem(
+                order=self,
+                product=variant.product,
+                variant=variant,
+                product_size=variant.size or None,
+                quantity=quantity,
+                lineitem_total=variant.product.price * quantity,
+            )
+            for variant, quantity in lines
+        ])
+        self.update_total()
+
+    def apply_lineitem_change(self, delta):
+        """
+        Add the change in a line item's total to the order total,
+        then update the delivery cost & grand total to match.
+        This takes the same time no matter how many line items the
+        order has, as the line items don't need to be summed again.
+        """
+        with transaction.atomic():
+            # F() adds the delta within the database, so two line items
+            # changing at the same time can't overwrite each other's change
+            # The update also locks the order's row until we're done
+            Order.objects.filter(pk=self.pk).update(
+                order_total=F('order_total') + delta)
+
+            self.order_total = Order.objects.values_list(
+                'order_total', flat=True).get(pk=self.pk)
+            self.delivery_cost = self.calculate_delivery_cost(self.order_total)
+            self.grand_total = self.order_total + self.delivery_cost
+
+            Order.objects.filter(pk=self.pk).update(
+                delivery_cost=self.delivery_cost,
+                grand_total=self.grand_total)
+
     def save(self, *args, **kwargs):
         """
         Override the original save method to set the order number
@@ -127,6 +205,11 @@ class OrderLineItem(models.Model):
     # product as well
     product = models.ForeignKey(Product, null=False, blank=False, on_delete=models.CASCADE)
 
+    # The variant (product & size) that was bought. Line items from before
+    # variants existed may not have one, and the product_size is kept so
+    # the line item still makes sense if the variant is deleted
+    variant = models.ForeignKey(ProductVariant, null=True, blank=True, on_delete=models.SET_NULL)
+
     product_size = models.CharField(max_length=2, null=True, blank=True) # XS, S, M, L, XL
     quantity = models.IntegerField(null=False, blank=False, default=0)
 
@@ -134,6 +217,16 @@ class OrderLineItem(models.Model):
     lineitem_total = models.DecimalField(max_digits=6, decimal_places=2, null=False, blank=False, editable=False)
 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the line item's total & order as they were loaded,
+        so the signals can work out how much the order total changes by
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
         """
         Override the original save method to set the lineitem total
@@ -143,4 +236,147 @@ class OrderLineItem(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f'SKU {self.product.sku} on order {self.order.order_number}'
\ No newline at end of file
+        return f'SKU {self.product.sku} on order {self.order.order_number}'
+
+# Orders older than a year or so are moved here by the archive_orders
+# management command, keeping the order & line item tables (and their
+# indexes) small. Archived orders keep their original id & order number
+# and have the same fields as orders, so customers can still look
+# at them from their profile
+class ArchivedOrder(models.Model):
+
+    # Unique & indexed as archived orders are looked up by their number
+    order_number = models.CharField(max_length=32, null=False, editable=False, unique=True)
+
+    user_profile = models.ForeignKey(UserProfile,
+                                     on_delete=models.SET_NULL,
+                                     null=True,
+                                     blank=True,
+                                     related_name='archived_orders')
+
+    full_name = models.CharField(max_length=50, null=False, blank=False)
+    email = models.EmailField(max_length=254, null=False, blank=False)
+    phone_number = models.CharField(max_length=20, null=False, blank=False)
+    country = CountryField(blank_label="Country", null=False, blank=False)
+    postcode = models.CharField(max_length=20, null=True, blank=True)
+    town_or_city = models.CharField(max_length=40, null=False, blank=False)
+    street_address1 = models.CharField(max_length=80, null=False, blank=False)
+    street_address2 = models.CharField(max_length=80, null=True, blank=True)
+    county = models.CharField(max_length=80, null=True, blank=True)
+
+    # The date the order was placed, not when it was archived
+    date = models.DateTimeField(db_index=True)
+
+    delivery_cost = models.DecimalField(max_digits=6, decimal_places=2, null=False, default=0)
+    order_total = models.DecimalField(max_digits=10, decimal_places=2, null=False, default=0)
+    grand_total = models.DecimalField(max_digits=10, decimal_places=2, null=False, default=0)
+    original_bag = models.TextField(null=False, blank=False, default="")
+    stripe_pid = models.CharField(max_length=254, null=False, blank=False, default="", db_index=True)
+    shipping_notice_sent_at = models.DateTimeField(null=True, blank=True)
+
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.order_number
+
+
+# The line items of archived orders, with the same
+# fields as line items so templates can show either
+class ArchivedOrderLineItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, null=False, blank=False, on_delete=models.CASCADE, related_name='lineitems')
+    product = models.ForeignKey(Product, null=False, blank=False, on_delete=models.CASCADE)
+    variant = models.ForeignKey(ProductVariant, null=True, blank=True, on_delete=models.SET_NULL)
+    product_size = models.CharField(max_length=2, null=True, blank=True)
+    quantity = models.IntegerField(null=False, blank=False, default=0)
+    lineitem_total = models.DecimalField(max_digits=6, decimal_places=2, null=False, blank=False, editable=False)
+
+    def __str__(self):
+        return f'SKU {self.product.sku} on archived order {self.order.order_number}'
+
+
+# Holds the information needed to create an order from the webhook
+# (the bag, who placed it & if they want their info saved) until the
+# payment has gone through. Storing it here instead of in the payment
+# intent's metadata saves a request to stripe while the customer waits
+# and means the bag isn't limited by the size of stripe's metadata
+class PendingCheckout(models.Model):
+
+    # The stripe payment intent ID this checkout belongs to
+    stripe_pid = models.CharField(max_length=254, unique=True)
+
+    # The shopping bag as a json string, exactly as it'll be stored
+    # in the original_bag field of the order
+    bag = models.TextField(null=False, blank=False, default="")
+
+    # The format the bag was saved in (bag.utils.BAG_VERSION), as
+    # checkouts from before variants existed hold product keyed bags
+    bag_version = models.IntegerField(default=1)
+
+    username = models.CharField(max_length=150, null=False, blank=False)
+    save_info = models.BooleanField(default=False)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def delete_stale(cls):
+        """
+        Delete the pending checkouts that were never paid for,
+        returning how many were deleted. Paid ones are deleted
+        by the webhook handler once the order exists.
+        """
+        cutoff = timezone.now() - timedelta(days=settings.PENDING_CHECKOUT_DAYS)
+        deleted, _ = cls.objects.filter(updated__lt=cutoff).delete()
+        return deleted
+
+    def __str__(self):
+        return self.stripe_pid
+
+
+# Webhooks from stripe are queued here and processed by the
+# process_webhooks management command, so the webhook view can
+# reply to stripe straight away instead of waiting for the order
+# to be created & the confirmation email to be sent
+class WebhookEvent(models.Model):
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    class Meta:
+        # The worker looks for pending events that are due
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    # Stripe can send the same event more than once,
+    # so the event id is unique to avoid processing it twice
+    stripe_event_id = models.CharField(max_length=254, unique=True)
+    event_type = models.CharField(max_length=100)
+
+    # The verified event as a json string
+    payload = models.TextField()
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+
+    # Failed events are retried after this time, backing off each attempt
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    # When a worker claimed the event, so events held by a worker
+    # that died can be picked up again
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    last_error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.event_type} ({self.stripe_event_id})'
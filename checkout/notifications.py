@@ -0,0 +1,125 @@
+"""
+Emails sent to customers about their orders.
+
+Each kind of email has a subject & body template, which are compiled
+the first time they're used & kept for the life of the process.
+Sending many emails at once reuses one connection to the mail server
+for every message, instead of send_mail's new connection for every
+email, and reports how many were sent per second.
+"""
+import logging
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+# The subject & body templates for each kind of email
+EMAIL_TEMPLATES = {
+    'confirmation': (
+        'checkout/confirmation_emails/confirmation_email_subject.txt',
+        'checkout/confirmation_emails/confirmation_email_body.txt',
+    ),
+    'shipping': (
+        'checkout/shipping_emails/shipping_email_subject.txt',
+        'checkout/shipping_emails/shipping_email_body.txt',
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def _get_template(template_name):
+    """Load & compile a template once"""
+    return get_template(template_name)
+
+
+def build_email(order, kind, connection=None):
+    """
+    Return the email of the given kind for an order
+    """
+    subject_template, body_template = EMAIL_TEMPLATES[kind]
+    context = {"order": order, "contact_email": settings.DEFAULT_FROM_EMAIL}
+
+    # Subjects can't contain new lines
+    subject = ''.join(_get_template(subject_template).render(context).splitlines())
+    body = _get_template(body_template).render(context)
+
+    return EmailMessage(
+        subject,
+        body,
+        settings.DEFAULT_FROM_EMAIL,
+        [order.email],
+        connection=connection,
+    )
+
+
+def send_confirmation_email(order):
+    """
+    Send the customer a confirmation of their order
+    """
+    build_email(order, 'confirmation').send()
+
+
+def _send_batch(connection, batch):
+    """
+    Send a batch of (order, email) pairs over one connection,
+    returning the orders whose emails were sent
+    """
+    sent = []
+    for order, message in batch:
+        try:
+            # Open the connection ourselves, otherwise send_messages
+            # closes it again after each email. Opening a connection
+            # that's already open does nothing, so this only connects
+            # again after a failure
+            connection.open()
+            # Sending one email at a time means we know exactly which
+            # were sent if one fails
+            if connection.send_messages([message]):
+                sent.append(order)
+        except Exception as e:
+            logger.error('Failed to send an email to %s: %s', ', '.join(message.to), e)
+            # The connection may be broken, so start a new one
+            connection.close()
+    return sent
+
+
+def send_bulk(orders, kind, batch_size=100, progress=None, on_sent=None):
+    """
+    Send the given kind of email for every order, a batch at a time
+    over a single connection. Returns a dict of how many were sent,
+    how many failed, how long it took & the emails sent per second.
+    progress is called with the stats after each batch, and on_sent
+    with the orders whose emails were sent, so they can be recorded.
+    """
+    connection = get_connection()
+    stats = {'sent': 0, 'failed': 0, 'seconds': 0.0, 'per_second': 0.0}
+    start = time.monotonic()
+
+    def send(batch):
+        sent = _send_batch(connection, batch)
+        if sent and on_sent:
+            on_sent(sent)
+        stats['sent'] += len(sent)
+        stats['failed'] += len(batch) - len(sent)
+        stats['seconds'] = time.monotonic() - start
+        stats['per_second'] = stats['sent'] / stats['seconds'] if stats['seconds'] else 0.0
+        if progress:
+            progress(stats)
+
+    try:
+        batch = []
+        for order in orders.iterator(chunk_size=batch_size):
+            batch.append((order, build_email(order, kind, connection)))
+            if len(batch) == batch_size:
+                send(batch)
+                batch = []
+        if batch:
+            send(batch)
+    finally:
+        connection.close()
+
+    return stats
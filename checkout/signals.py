@@ -1,7 +1,10 @@
+import contextvars
+from contextlib import contextmanager
+
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from .models import OrderLineItem
+from .models import Order, OrderLineItem
 
 # Functions within this file are called each time a line item
 # is attached to an order
@@ -16,18 +19,58 @@ from .models import OrderLineItem
 # So in the examples below, we're setting up these functions to recieve
 # signals on if a OrderLineItem has been saved or deleted respectively.
 
+_totals_frozen = contextvars.ContextVar('totals_frozen', default=False)
+
+
+@contextmanager
+def freeze_order_totals():
+    """
+    Don't update order totals as line items are deleted inside the
+    with block, e.g when whole orders are being deleted or archived
+    """
+    token = _totals_frozen.set(True)
+    try:
+        yield
+    finally:
+        _totals_frozen.reset(token)
+
+
 @receiver(post_save, sender=OrderLineItem)
 def update_on_save(sender, instance, created, **kwargs):
     """
     Update order total on lineitem update/create
     """
+    # The total & order the line item had when it was loaded,
+    # a new line item had nothing to take away from any order
+    loaded_values = getattr(instance, '_loaded_values', {})
+    old_total = loaded_values.get('lineitem_total') or 0
+    old_order_id = loaded_values.get('order_id')
+
     # instance.order is the order this line item is related to
-    # call the update_total method on it
-    instance.order.update_total()
+    # add the difference the line item has made to it's total
+    if created or old_order_id is None or old_order_id == instance.order_id:
+        instance.order.apply_lineitem_change(instance.lineitem_total - old_total)
+    else:
+        # The line item has moved to a different order
+        Order(pk=old_order_id).apply_lineitem_change(-old_total)
+        instance.order.apply_lineitem_change(instance.lineitem_total)
+
+    # The line item as it is now is what the next save will be compared to
+    instance._loaded_values = {
+        'lineitem_total': instance.lineitem_total,
+        'order_id': instance.order_id,
+    }
+
 
 @receiver(post_delete, sender=OrderLineItem)
 def update_on_delete(sender, instance, **kwargs):
     """
     Update order total on lineitem delete
     """
-    instance.order.update_total()
\ No newline at end of file
+    if _totals_frozen.get():
+        return
+
+    # Take away the total that was saved for the line item
+    loaded_values = getattr(instance, '_loaded_values', {})
+    old_total = loaded_values.get('lineitem_total', instance.lineitem_total)
+    instance.order.apply_lineitem_change(-old_total)
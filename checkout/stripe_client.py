@@ -0,0 +1,165 @@
+"""
+A single place for every call we make to Stripe.
+
+Rather than each view setting stripe.api_key and relying on the
+library's default http behaviour, all calls go through one client.
+The client keeps a pooled keep-alive http session, uses explicit
+connect & read timeouts, retries network failures a bounded number
+of times (stripe adds jitter to the delay between retries) and records
+how long each call took.
+
+The client in use is set by the STRIPE_CLIENT setting, so it can be
+swapped for FakeStripeClient (or any class with the same methods)
+in tests & benchmarks.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+import requests
+import stripe
+from stripe.http_client import RequestsClient
+
+logger = logging.getLogger(__name__)
+
+
+class StripeClient:
+    """Make calls to Stripe over a shared, pooled http session"""
+
+    def __init__(self):
+        self.api_key = settings.STRIPE_SECRET_KEY
+
+        # One keep-alive session, shared by every call in this process
+        # The adapter's pool size caps how many connections we keep open
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+        )
+        session.mount('https://', adapter)
+
+        # Requests accepts a (connect, read) tuple as the timeout
+        # This stops a slow stripe from holding our workers for up
+        # to 80 seconds, which is the library's default
+        stripe.default_http_client = RequestsClient(
+            timeout=(settings.STRIPE_CONNECT_TIMEOUT,
+                     settings.STRIPE_READ_TIMEOUT),
+            session=session,
+        )
+
+        # Stripe retries connection errors & conflicts itself, backing off
+        # exponentially with jitter and adding idempotency keys to posts
+        stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+
+        # Latency metrics for each type of call, e.g
+        # {"PaymentIntent.create": {"count": 2, "errors": 0, ...}}
+        self.metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def _record(self, name, duration, failed):
+        """Record how long a call to stripe took"""
+        with self._metrics_lock:
+            stats = self.metrics.setdefault(name, {
+                'count': 0,
+                'errors': 0,
+                'total_seconds': 0.0,
+                'max_seconds': 0.0,
+            })
+            stats['count'] += 1
+            stats['total_seconds'] += duration
+            stats['max_seconds'] = max(stats['max_seconds'], duration)
+            if failed:
+                stats['errors'] += 1
+
+        logger.info('stripe %s took %.1fms%s', name, duration * 1000,
+                    ' (failed)' if failed else '')
+
+    def _call(self, name, func, *args, **kwargs):
+        """Call stripe using our api key, timing how long it takes"""
+        start = time.monotonic()
+        failed = True
+        try:
+            result = func(*args, api_key=self.api_key, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._record(name, time.monotonic() - start, failed)
+
+    def create_payment_intent(self, **params):
+        return self._call('PaymentIntent.create',
+                          stripe.PaymentIntent.create, **params)
+
+    def modify_payment_intent(self, pid, **params):
+        return self._call('PaymentIntent.modify',
+                          stripe.PaymentIntent.modify, pid, **params)
+
+    def construct_event(self, payload, sig_header, secret):
+        """
+        Verify a webhook's signature & build the event from it
+        This happens locally, so no request is made to stripe
+        """
+        return stripe.Webhook.construct_event(
+            payload, sig_header, secret, api_key=self.api_key)
+
+
+class FakeStripeClient:
+    """
+    A local stand-in for StripeClient which never leaves the process.
+    Payment intents are kept in memory, so tests & benchmarks can
+    run the checkout without network access.
+    """
+
+    def __init__(self):
+        self.api_key = settings.STRIPE_SECRET_KEY
+        self.metrics = {}
+        self.payment_intents = {}
+
+    def create_payment_intent(self, **params):
+        pid = f'pi_{uuid.uuid4().hex[:24]}'
+        intent = stripe.PaymentIntent.construct_from({
+            'id': pid,
+            'object': 'payment_intent',
+            'client_secret': f'{pid}_secret_{uuid.uuid4().hex[:24]}',
+            'metadata': {},
+            **params,
+        }, self.api_key)
+        self.payment_intents[pid] = intent
+        return intent
+
+    def modify_payment_intent(self, pid, **params):
+        if pid not in self.payment_intents:
+            raise stripe.error.InvalidRequestError(
+                f'No such payment_intent: {pid}', 'id')
+        self.payment_intents[pid].update(params)
+        return self.payment_intents[pid]
+
+    def construct_event(self, payload, sig_header, secret):
+        return stripe.Webhook.construct_event(
+            payload, sig_header, secret, api_key=self.api_key)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_stripe_client():
+    """
+    Return the client shared by this process, creating it
+    from the STRIPE_CLIENT setting the first time it's needed
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = import_string(settings.STRIPE_CLIENT)()
+    return _client
+
+
+def set_stripe_client(client):
+    """Swap the shared client, e.g for a FakeStripeClient in tests"""
+    global _client
+    _client = client
@@ -1,3 +1,244 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from bag.utils import BAG_VERSION
+from products.models import Product, ProductVariant
+from products.recommendations import _baskets
+
+from . import notifications
+from .archive import archive_orders
+from .exports import iter_orders, orders_between
+from .models import ArchivedOrder, Order, OrderLineItem
+from .stripe_client import FakeStripeClient, set_stripe_client
+
+
+class FailingBackend(EmailBackend):
+    """A locmem backend that can't send emails to fail@example.com"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'fail@example.com' in message.to:
+                raise ConnectionError('The mail server went away')
+        return super().send_messages(messages)
+
+
+class SendBulkTests(TestCase):
+
+    def setUp(self):
+        for number in range(5):
+            self._create_order(f'customer{number}@example.com')
+
+    def _create_order(self, email):
+        return Order.objects.create(
+            full_name='Test Customer',
+            email=email,
+            phone_number='0123456789',
+            country='GB',
+            town_or_city='London',
+            street_address1='1 Test Street',
+        )
+
+    def test_sends_every_email_in_batches(self):
+        progress = mock.Mock()
+
+        stats = notifications.send_bulk(
+            Order.objects.order_by('pk'), 'shipping', batch_size=2, progress=progress)
+
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [[f'customer{number}@example.com'] for number in range(5)])
+        # Batches of 2, 2 & 1
+        self.assertEqual(progress.call_count, 3)
+
+    def test_uses_a_single_connection(self):
+        with mock.patch.object(notifications, 'get_connection',
+                               wraps=notifications.get_connection) as get_connection:
+            notifications.send_bulk(Order.objects.all(), 'shipping', batch_size=2)
+
+        get_connection.assert_called_once()
+        # Every email went over the same connection
+        connections = {id(message.connection) for message in mail.outbox}
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len(connections), 1)
+
+    @override_settings(EMAIL_BACKEND='checkout.tests.FailingBackend')
+    def test_counts_emails_sent_before_a_failure(self):
+        self._create_order('fail@example.com')
+        self._create_order('last@example.com')
+
+        with self.assertLogs('checkout.notifications', 'ERROR'):
+            stats = notifications.send_bulk(
+                Order.objects.order_by('pk'), 'shipping', batch_size=10)
+
+        # Only the failed email isn't sent, the rest of the batch still is
+        self.assertEqual(stats['sent'], 6)
+        self.assertEqual(stats['failed'], 1)
+        self.assertNotIn(['fail@example.com'], [message.to for message in mail.outbox])
+        self.assertIn(['last@example.com'], [message.to for message in mail.outbox])
+
+    def test_command_doesnt_resend_notices(self):
+        numbers = list(Order.objects.values_list('order_number', flat=True))
+        call_command('send_shipping_notices', *numbers[:2], stdout=mock.Mock())
+
+        # Running it again only emails the orders that weren't notified
+        call_command('send_shipping_notices', *numbers, stdout=mock.Mock())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(Order.objects.filter(shipping_notice_sent_at__isnull=True).exists())
+
+    def test_command_resends_notices_when_asked(self):
+        numbers = list(Order.objects.values_list('order_number', flat=True))
+        call_command('send_shipping_notices', *numbers, stdout=mock.Mock())
+
+        call_command('send_shipping_notices', *numbers, '--resend', stdout=mock.Mock())
+
+        self.assertEqual(len(mail.outbox), 10)
+
+
+@override_settings(
+    STRIPE_PUBLIC_KEY='pk_test',
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class PaymentIntentReuseTests(TestCase):
+
+    def setUp(self):
+        self.stripe = FakeStripeClient()
+        set_stripe_client(self.stripe)
+        self.addCleanup(set_stripe_client, None)
+
+        self.variants = [
+            ProductVariant.objects.get_or_create(
+                product=Product.objects.create(
+                    name=name, description='A product', price=price),
+                size='')[0]
+            for name, price in (('First', 10), ('Second', 10), ('Third', 20))
+        ]
+
+    def _set_bag(self, *variants):
+        session = self.client.session
+        session['bag'] = {str(variant.pk): 1 for variant in variants}
+        session['bag_version'] = BAG_VERSION
+        session.save()
+
+    def _checkout(self):
+        response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        return response.context['client_secret']
+
+    def test_reloading_reuses_the_intent(self):
+        self._set_bag(self.variants[0])
+
+        first = self._checkout()
+        second = self._checkout()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stripe.payment_intents), 1)
+
+    def test_same_total_reuses_the_intent_without_modifying_it(self):
+        self._set_bag(self.variants[0])
+        first = self._checkout()
+
+        # A different product at the same price
+        self._set_bag(self.variants[1])
+        with mock.patch.object(self.stripe, 'modify_payment_intent') as modify:
+            second = self._checkout()
+
+        self.assertEqual(first, second)
+        modify.assert_not_called()
+        self.assertEqual(len(self.stripe.payment_intents), 1)
+
+    def test_new_total_modifies_the_intent(self):
+        self._set_bag(self.variants[0])
+        first = self._checkout()
+
+        self._set_bag(self.variants[0], self.variants[2])
+        second = self._checkout()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stripe.payment_intents), 1)
+        intent = next(iter(self.stripe.payment_intents.values()))
+        # 10 + 20, plus 10% delivery as it's under the free delivery threshold
+        self.assertEqual(intent.amount, 3300)
+
+    def test_paid_intent_is_replaced(self):
+        self._set_bag(self.variants[0])
+        first = self._checkout()
+
+        # The webhook created the order, but the customer never
+        # reached the success page to clear the cached intent
+        Order.objects.create(
+            full_name='Test Customer', email='customer@example.com',
+            phone_number='0123456789', country='GB', town_or_city='London',
+            street_address1='1 Test Street', stripe_pid=first.split('_secret')[0])
+
+        second = self._checkout()
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.stripe.payment_intents), 2)
+
+
+class ArchivedOrderReaderTests(TestCase):
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=name, description='A product', price=10)
+            for name in ('First', 'Second', 'Third')
+        ]
+        # An old order of the first two products, which is archived
+        self.old_order = self._create_order(*self.products[:2])
+        Order.objects.filter(pk=self.old_order.pk).update(
+            date=timezone.now() - timedelta(days=400))
+        archive_orders(timezone.now() - timedelta(days=365))
+        self.new_order = self._create_order(*self.products[1:])
+
+    def _create_order(self, *products):
+        order = Order.objects.create(
+            full_name='Test Customer', email='customer@example.com',
+            phone_number='0123456789', country='GB', town_or_city='London',
+            street_address1='1 Test Street')
+        for product in products:
+            OrderLineItem.objects.create(order=order, product=product, quantity=1)
+        return order
+
+    def test_export_includes_archived_orders(self):
+        exported = list(iter_orders(orders_between()))
+
+        self.assertEqual(
+            [order['order_number'] for order in exported],
+            [self.old_order.order_number, self.new_order.order_number])
+        self.assertEqual(
+            [len(order['lineitems']) for order in exported], [2, 2])
+
+    def test_export_of_a_recent_range_leaves_the_archive_out(self):
+        exported = list(iter_orders(orders_between(start=timezone.now().date())))
+
+        self.assertEqual(
+            [order['order_number'] for order in exported], [self.new_order.order_number])
+
+    def test_shipping_notices_refuse_archived_orders(self):
+        self.assertTrue(ArchivedOrder.objects.filter(
+            order_number=self.old_order.order_number).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('send_shipping_notices', self.old_order.order_number,
+                         stdout=mock.Mock())
+
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_baskets_include_archived_orders(self):
+        baskets = list(_baskets())
+
+        self.assertCountEqual(baskets, [
+            {self.products[0].pk, self.products[1].pk},
+            {self.products[1].pk, self.products[2].pk},
+        ])
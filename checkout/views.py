@@ -3,16 +3,94 @@ from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.conf import settings
 from django.http import HttpResponse
+from django.db import transaction
 
 from .forms import OrderForm
-from .models import Order, OrderLineItem
-from products.models import Product
+from .models import Order, PendingCheckout
+from products.models import ProductVariant
 from profiles.forms import UserProfileForm
 from profiles.models import UserProfile
 from bag.contexts import bag_contents
+from bag.utils import BAG_VERSION, get_bag
+from inventory.reservations import OutOfStock, reserve_bag
+from .stripe_client import get_stripe_client
 
 import stripe
 import json
+import hashlib
+
+
+def _bag_hash(bag, stripe_total):
+    """
+    Create a hash of the bag & total so we can tell whether the
+    bag has changed since the payment intent was created
+    """
+    # sort_keys makes sure the same bag always produces the same string
+    bag_string = f'{json.dumps(bag, sort_keys=True)}:{stripe_total}'
+    return hashlib.sha256(bag_string.encode()).hexdigest()
+
+
+def _get_or_create_payment_intent(request, bag, stripe_total):
+    """
+    Return the client secret of a payment intent for this bag.
+
+    The intent is cached in the session, so reloading the checkout
+    page re-uses the existing intent instead of creating a new one.
+    If only the amount has changed, the existing intent is modified.
+    """
+    bag_hash = _bag_hash(bag, stripe_total)
+    cached_intent = request.session.get('checkout_intent')
+
+    # If the customer never reached the success page, the webhook may
+    # have already created an order from the cached intent. It's been
+    # paid for, so it can't be used again & we need a new one
+    if cached_intent and Order.objects.filter(stripe_pid=cached_intent['pid']).exists():
+        del request.session['checkout_intent']
+        cached_intent = None
+
+    if cached_intent:
+        # Same bag & total as last time, no need to contact stripe at all
+        if cached_intent['bag_hash'] == bag_hash:
+            return cached_intent['client_secret']
+
+        # The bag has changed but the amount to charge hasn't, so
+        # the existing intent is still correct as it is
+        if cached_intent['amount'] == stripe_total:
+            cached_intent['bag_hash'] = bag_hash
+            request.session['checkout_intent'] = cached_intent
+            return cached_intent['client_secret']
+
+        # Otherwise update the amount on the existing intent
+        try:
+            intent = get_stripe_client().modify_payment_intent(
+                cached_intent['pid'],
+                amount=stripe_total,
+            )
+        except stripe.error.StripeError:
+            # The intent can't be modified anymore (it may have been
+            # cancelled or already paid), so we'll create a new one below
+            intent = None
+    else:
+        intent = None
+
+    if intent is None:
+        # Create payment intent, giving it the amount & currency
+        intent = get_stripe_client().create_payment_intent(
+            amount=stripe_total,
+            currency=settings.STRIPE_CURRENCY,
+            payment_method_types=["card"],
+        )
+
+    # Remember the intent for the next time the checkout page loads
+    request.session['checkout_intent'] = {
+        'pid': intent.id,
+        'client_secret': intent.client_secret,
+        'bag_hash': bag_hash,
+        'amount': stripe_total,
+    }
+
+    return intent.client_secret
+
 
 @require_POST
 def cache_checkout_data(request):
@@ -20,20 +98,36 @@ def cache_checkout_data(request):
     Before the confirm card payment in stripe_elements.js is called,
     a post request is made to this view, providing it the client secret
     from the payment intent.
+
+    The bag, username & save_info are stored in a pending checkout
+    so the webhook handler can find them using the payment intent id,
+    and the stock for everything in the bag is reserved.
     """
     try:
         # Split at the word secret to get the payment intent id
         pid = request.POST.get('client_secret').split("_secret")[0]
 
-        # Setup stripe with the secret id so we can modify payment intent
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-
-        # Modify payment intent with it's id and modify it with metadata
-        stripe.PaymentIntent.modify(pid, metadata={
-            "username": request.user,
-            "save_info": request.POST.get("save_info"),
-            "bag": json.dumps(request.session.get("bag"))
-        })
+        # Hold the stock while the customer pays, so nobody else
+        # can buy the last of an item in the meantime
+        try:
+            reserve_bag(pid, get_bag(request))
+        except OutOfStock as e:
+            messages.error(request, (
+                f"Sorry, we don't have enough {e.stock_level} left in stock. "
+                "Please update your bag and try again."))
+            return HttpResponse(content=e, status=400)
+
+        # Store the checkout's details against the payment intent id
+        # The customer may submit more than once, so update if it exists
+        PendingCheckout.objects.update_or_create(
+            stripe_pid=pid,
+            defaults={
+                "username": str(request.user),
+                "save_info": request.POST.get("save_info") == "true",
+                "bag": json.dumps(get_bag(request)),
+                "bag_version": BAG_VERSION,
+            },
+        )
 
         # Return a http response with a status of ok
         return HttpResponse(status=200)
@@ -48,13 +142,13 @@ def checkout(request):
     """
 
     # Beginning of creation of stripe payment intent
-    # get keys from env variables
+    # get the public key from env variables, the secret key
+    # is held by our stripe client
     stripe_public_key = settings.STRIPE_PUBLIC_KEY
-    stripe_secret_key = settings.STRIPE_SECRET_KEY
 
     if request.method == "POST":
         # Get bag from session
-        bag = request.session.get("bag", {})
+        bag = get_bag(request)
 
         form_data = {
             "full_name": request.POST["full_name"],
@@ -89,50 +183,28 @@ def checkout(request):
             # Json.dumps converts Python object to json string
             order.original_bag = json.dumps(bag)
 
-            # Save the order
-            order.save()
-
-            # We'll then iterate through the bag items to create line items
-            for item_id, item_data in bag.items():
-                try:
-                    # Get the product id from the bag
-                    product = Product.objects.get(id=item_id)
-
-                    # If it's data (value) is an int,
-                    #  we know we're dealing with an
-                    # item that has no sizes, therefore
-                    # the item data is the quantity as reflected in dict below
-                    if isinstance(item_data, int):
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-                    # otherwise if it not an integer
-                    # We'll iterate over each size and create
-                    # a line item accordingly
-                    else:
-                        for size, quantity in item_data['items_by_size'].items():
-                            order_line_item = OrderLineItem(
-                                order=order,
-                                product=product,
-                                quantity=quantity,
-                                product_size=size,
-                            )
-                            order_line_item.save()
-                # Despite this being unlikely,
-                # We'll error handle if a product does not exist by
-                # Sending a message, delete order & redirect user to bag page
-                except Product.DoesNotExist:
-                    messages.error(request, (
-                        "One of the products in your bag wasn't found in our database. "
-                        "Please call us for assistance!")
-                    )
-                    order.delete()
-                    return redirect(reverse('view_bag'))
-
-            # Whilst still in loop, we'll attach whether the user wanted to
+            # Save the order & then create a line item for each variant
+            # in the bag, getting all of the variants & products in a
+            # single query. Both happen in one transaction, so nothing
+            # (like the sales rollups) ever sees the order without
+            # it's line items
+            try:
+                with transaction.atomic():
+                    order.save()
+                    order.add_lineitems_from_bag(bag)
+
+            # Despite this being unlikely,
+            # We'll error handle if a product does not exist by
+            # Sending a message & redirect user to bag page
+            # The transaction is rolled back, so the order isn't saved
+            except ProductVariant.DoesNotExist:
+                messages.error(request, (
+                    "One of the products in your bag wasn't found in our database. "
+                    "Please call us for assistance!")
+                )
+                return redirect(reverse('view_bag'))
+
+            # We'll then attach whether the user wanted to
             # save their profile information to the session
             request.session['save_info'] = 'save-info' in request.POST
 
@@ -149,7 +221,7 @@ def checkout(request):
     else:
 
         # Get bag from session
-        bag = request.session.get("bag", {})
+        bag = get_bag(request)
 
         # If there's nothing in the bag, provide an
         # error message and redirect user to product page
@@ -168,15 +240,9 @@ def checkout(request):
         # as stipe requires the amount to charge as an integer
         stripe_total = round(total * 100)
 
-        # Set the secret key to stripe
-        stripe.api_key = stripe_secret_key
-
-        # Create payment intent, giving it the amount & currency
-        intent = stripe.PaymentIntent.create(
-            amount=stripe_total,
-            currency=settings.STRIPE_CURRENCY,
-            payment_method_types=["card"],
-        )
+        # Get the payment intent for this bag, re-using the one
+        # stored in the session if the customer has been here before
+        client_secret = _get_or_create_payment_intent(request, bag, stripe_total)
 
         # If the user is authenticated
         if request.user.is_authenticated:
@@ -213,7 +279,7 @@ def checkout(request):
         context = {
             "order_form": order_form,
             "stripe_public_key": stripe_public_key,
-            "client_secret": intent.client_secret,
+            "client_secret": client_secret,
         }
 
         # Render the template with it's context
@@ -274,6 +340,12 @@ def checkout_success(request, order_number):
     # longer be needed for this session
     if 'bag' in request.session:
         del request.session['bag']
+        request.session.pop('bag_version', None)
+
+    # The payment intent has been used, so the next checkout
+    # will need a new one
+    if 'checkout_intent' in request.session:
+        del request.session['checkout_intent']
 
     # Get the template
     template = 'checkout/checkout_success.html'
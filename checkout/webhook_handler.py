@@ -2,13 +2,13 @@
 # Webhooks are similar to django signals, except that they're sent securely
 # from stripe to a URL we specify, hence including httpresponse below
 from django.http import HttpResponse
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
+from django.db import transaction
 
-from .models import Order, OrderLineItem
-from products.models import Product
+from .models import Order, PendingCheckout
+from .notifications import send_confirmation_email
 from profiles.models import UserProfile
+from inventory.reservations import confirm_reservations, release_reservations
+from bag.utils import upgrade_bag
 
 import json
 import time
@@ -35,31 +35,35 @@ class StripeWH_Handler:
         Send the user a confirmation email
         """
 
-        # Store the customer's email from the order in a variable
-        cust_email = order.email
-
-        # Render both text email files to strings
-        # First param is the file path
-        # Second is the context i.e the order information to be interpolated
-        subject = render_to_string(
-            'checkout/confirmation_emails/confirmation_email_subject.txt',
-            {"order": order}
-        )
-
-        # Do the same for body, except provide a default email from django
-        body = render_to_string(
-            'checkout/confirmation_emails/confirmation_email_body.txt',
-            {"order": order, "contact_email": settings.DEFAULT_FROM_EMAIL}
-        )
-
-        # Send the email providing
-        # Subject title, body, email sending from & emails sending to
-        send_mail(
-            subject,
-            body,
-            settings.DEFAULT_FROM_EMAIL,
-            [cust_email]
-        )
+        # The email templates are compiled once & kept,
+        # rather than read & compiled for every order
+        send_confirmation_email(order)
+
+    def _delete_pending_checkout(self, pid):
+        """
+        The order exists, so the bag & details stored
+        for the checkout aren't needed anymore
+        """
+        PendingCheckout.objects.filter(stripe_pid=pid).delete()
+
+    def dispatch(self, event):
+        """
+        Pass the event to the method that handles it's type
+        """
+        # Map webhook events to relevant handler functions
+        # keys will match the names of webhooks coming from stripe
+        # while it's values will be actual methods inside the webhook handler
+        event_map = {
+            'payment_intent.succeeded': self.handle_payment_intent_succeeded,
+            'payment_intent.payment_failed': self.handle_payment_intent_payment_failed,
+        }
+
+        # Look up the event's type, which will be something along the lines of
+        # "payment_intent.succeeded", falling back to the generic handler
+        event_handler = event_map.get(event['type'], self.handle_event)
+
+        # Call the event handler with the event & return it's response
+        return event_handler(event)
 
     def handle_event(self, event):
         """
@@ -81,8 +85,30 @@ class StripeWH_Handler:
         intent = event.data.object
 
         pid = intent.id
-        bag = intent.metadata.bag
-        save_info = intent.metadata.save_info
+
+        # The bag, username & save_info were stored in a pending checkout
+        # by the cache_checkout_data view, before the payment was confirmed
+        try:
+            pending_checkout = PendingCheckout.objects.get(stripe_pid=pid)
+            bag = pending_checkout.bag
+            bag_version = pending_checkout.bag_version
+            save_info = pending_checkout.save_info
+            username = pending_checkout.username
+        except PendingCheckout.DoesNotExist:
+            # The pending checkout is deleted once the order has been
+            # created, so this may be stripe sending the event again
+            if Order.objects.filter(stripe_pid=pid).exists():
+                return HttpResponse(
+                    content=f'Webhook received: {event["type"]} | SUCCESS: Verified order already in database',
+                    status=200)
+
+            # Payment intents from before pending checkouts existed
+            # still have this information in their metadata
+            # and their bags were always keyed by product
+            bag = intent.metadata.bag
+            bag_version = 1
+            save_info = intent.metadata.save_info == "true"
+            username = intent.metadata.username
 
         billing_details = intent.charges.data[0].billing_details
 
@@ -102,9 +128,6 @@ class StripeWH_Handler:
         # Start with profile set to none, allowing anonymous users to checkout
         profile = None
 
-        # Get username from intent
-        username = intent.metadata.username
-        
         # If the username is anything but AnonymousUser
         # We know they're an authenticated user
         if username != "AnonymousUser":
@@ -169,6 +192,10 @@ class StripeWH_Handler:
 
         if order_exists:
 
+            # The stock held for this checkout has now been sold
+            confirm_reservations(pid)
+            self._delete_pending_checkout(pid)
+
             # Payment has absolutely been made at this point
             # so send email
             self._send_confirmation_email(order)
@@ -183,51 +210,45 @@ class StripeWH_Handler:
             order = None 
 
             try:
-                # We don't have a form to save in the web hook to create the order
-                # But we can do it with ordered objects created using all the data
-                # From the payment intent, after all it did come from the form originally
-                order = Order.objects.create(
-                    full_name=shipping_details.name,
-                    email=billing_details.email,
-                    phone_number=shipping_details.phone,
-                    country=shipping_details.address.country,
-                    postcode=shipping_details.address.postal_code,
-                    town_or_city=shipping_details.address.city,
-                    street_address1=shipping_details.address.line1,
-                    street_address2=shipping_details.address.line2,
-                    county=shipping_details.address.state,
-                    grand_total=grand_total,
-                    original_bag=bag,
-                    stripe_pid=pid
-                )
+                # Create the order & all of it's line items in one
+                # transaction, so if anything fails none of it is saved
+                with transaction.atomic():
+                    # We don't have a form to save in the web hook to create the order
+                    # But we can do it with ordered objects created using all the data
+                    # From the payment intent, after all it did come from the form originally
+                    order = Order.objects.create(
+                        full_name=shipping_details.name,
+                        user_profile=profile,
+                        email=billing_details.email,
+                        phone_number=shipping_details.phone,
+                        country=shipping_details.address.country,
+                        postcode=shipping_details.address.postal_code,
+                        town_or_city=shipping_details.address.city,
+                        street_address1=shipping_details.address.line1,
+                        street_address2=shipping_details.address.line2,
+                        county=shipping_details.address.state,
+                        grand_total=grand_total,
+                        original_bag=bag,
+                        stripe_pid=pid
+                    )
+
+                    # Here we're loading the bag from it's JSON version & creating
+                    # every line item at once, with one query for the products
+                    # Bags saved before variants existed are converted first
+                    order.add_lineitems_from_bag(
+                        upgrade_bag(json.loads(bag), bag_version))
 
-                # Here we're loading the bag from the JSON version within payment intent
-                for item_id, item_data in json.loads(bag).items():
-
-                    # Get the product id from the bag
-                    product = Product.objects.get(id=item_id)
-
-                    # If it's data (value) is an int,
-                    #  we know we're dealing with an
-                    # item that has no sizes, therefore
-                    # the item data is the quantity as reflected in dict below
-                    if isinstance(item_data, int):
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-        
             except Exception as e:
-                # If anything goes wrong, we'll just delete the order
-                # If it was created and return a 500 server error response to stripe
+                # If anything goes wrong, the transaction is rolled back so the
+                # order won't exist. We return a 500 server error response to stripe
                 # This will cause stripe to try the web hook again later
-                if order:
-                    order.delete()
-                    return HttpResponse(
-                content=f'Webhook received: {event["type"]} | ERROR: {e}',
-                status=500)
+                return HttpResponse(
+                    content=f'Webhook received: {event["type"]} | ERROR: {e}',
+                    status=500)
+
+        # The stock held for this checkout has now been sold
+        confirm_reservations(pid)
+        self._delete_pending_checkout(pid)
 
         # Payment has absolutely been made at this point
         # so send email
@@ -241,6 +262,10 @@ class StripeWH_Handler:
         """
         Handle the payment_intent.payment_failed webhook from Stripe
         """
+        # Put back the stock held for this checkout, it'll be reserved
+        # again if the customer tries to pay a second time
+        release_reservations(event.data.object.id)
+
         return HttpResponse(
             content=f'Webhook received: {event["type"]}',
             status=200)
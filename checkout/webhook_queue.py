@@ -0,0 +1,135 @@
+"""
+A queue of stripe webhook events, stored in the WebhookEvent table.
+
+The webhook view only verifies & enqueues the event, then replies to
+stripe. The process_webhooks management command claims events from
+the queue and runs them through StripeWH_Handler, retrying failures
+with an exponential backoff.
+"""
+import json
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+import stripe
+
+from .models import WebhookEvent
+from .webhook_handler import StripeWH_Handler
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_event(event, payload):
+    """
+    Add a verified stripe event to the queue
+    Events stripe has already sent us are ignored
+    """
+    webhook_event, created = WebhookEvent.objects.get_or_create(
+        stripe_event_id=event['id'],
+        defaults={
+            'event_type': event['type'],
+            'payload': payload.decode('utf-8') if isinstance(payload, bytes) else payload,
+        },
+    )
+    return webhook_event
+
+
+def _claimable(now):
+    """
+    Events that are due, or that were claimed by a worker so
+    long ago that the worker must have died
+    """
+    stale = now - timedelta(seconds=settings.STRIPE_WH_QUEUE_VISIBILITY_TIMEOUT)
+    return WebhookEvent.objects.filter(
+        Q(status=WebhookEvent.PENDING, next_attempt_at__lte=now) |
+        Q(status=WebhookEvent.PROCESSING, locked_at__lt=stale)
+    ).order_by('next_attempt_at')
+
+
+def claim_events(limit):
+    """
+    Claim up to limit events for this worker, so no other
+    worker will process them at the same time
+    """
+    now = timezone.now()
+
+    if connection.features.has_select_for_update_skip_locked:
+        # Postgres & friends: rows locked by another worker are skipped,
+        # so workers never wait on each other
+        with transaction.atomic():
+            ids = list(
+                _claimable(now)
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:limit]
+            )
+            WebhookEvent.objects.filter(id__in=ids).update(
+                status=WebhookEvent.PROCESSING, locked_at=now)
+    else:
+        # SQLite has no row locks, so we claim each event with an update
+        # that only succeeds if it's still claimable when we get to it
+        ids = []
+        for event in _claimable(now).values('id', 'status', 'locked_at')[:limit]:
+            claimed = WebhookEvent.objects.filter(
+                id=event['id'],
+                status=event['status'],
+                locked_at=event['locked_at'],
+            ).update(status=WebhookEvent.PROCESSING, locked_at=now)
+            if claimed:
+                ids.append(event['id'])
+
+    return list(WebhookEvent.objects.filter(id__in=ids).order_by('next_attempt_at'))
+
+
+def _retry_delay(attempts):
+    """
+    Seconds to wait before the next attempt, doubling each attempt
+    up to a maximum. Full jitter spreads out retries after a burst
+    """
+    delay = min(settings.STRIPE_WH_QUEUE_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+                settings.STRIPE_WH_QUEUE_RETRY_MAX_DELAY)
+    return random.uniform(0, delay)
+
+
+def process_event(webhook_event):
+    """
+    Run a claimed event through the webhook handler, recording
+    whether it succeeded or needs to be retried
+    """
+    webhook_event.attempts += 1
+
+    try:
+        event = stripe.Event.construct_from(
+            json.loads(webhook_event.payload), settings.STRIPE_SECRET_KEY)
+
+        # There's no request from stripe here, as the
+        # event is being processed outside of the webhook view
+        response = StripeWH_Handler(None).dispatch(event)
+
+        if response.status_code >= 500:
+            raise RuntimeError(response.content.decode('utf-8'))
+
+    except Exception as e:
+        logger.warning('Webhook event %s failed (attempt %s): %s',
+                       webhook_event.stripe_event_id, webhook_event.attempts, e)
+        webhook_event.last_error = str(e)
+
+        if webhook_event.attempts >= settings.STRIPE_WH_QUEUE_MAX_ATTEMPTS:
+            webhook_event.status = WebhookEvent.FAILED
+        else:
+            webhook_event.status = WebhookEvent.PENDING
+            webhook_event.next_attempt_at = timezone.now() + timedelta(
+                seconds=_retry_delay(webhook_event.attempts))
+    else:
+        webhook_event.status = WebhookEvent.DONE
+        webhook_event.last_error = ""
+
+    webhook_event.locked_at = None
+    webhook_event.save(update_fields=[
+        'attempts', 'status', 'next_attempt_at', 'locked_at', 'last_error'])
+
+    return webhook_event.status == WebhookEvent.DONE
@@ -4,6 +4,8 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 
 from checkout.webhook_handler import StripeWH_Handler
+from checkout.stripe_client import get_stripe_client
+from checkout.webhook_queue import enqueue_event
 
 import stripe
 
@@ -13,11 +15,8 @@ import stripe
 @csrf_exempt
 def webhook(request):
     """Listen for webhooks from Stripe"""
-    # Setup stripe api key and webhook secret
+    # Get the webhook secret, the api key is held by our stripe client
     wh_secret = settings.STRIPE_WH_SECRET
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-
-    print(stripe.api_key)
 
     # Get the webhook data and verify its signature
     payload = request.body
@@ -25,8 +24,8 @@ def webhook(request):
     event = None
 
     try:
-        event = stripe.Webhook.construct_event(
-        payload, sig_header, wh_secret
+        event = get_stripe_client().construct_event(
+            payload, sig_header, wh_secret
         )
     except ValueError as e:
         # Invalid payload
@@ -37,31 +36,17 @@ def webhook(request):
     except Exception as e:
         return HttpResponse(content=e, status=400)
 
-    # Create instance of the stripe web hook handler function
-    handler = StripeWH_Handler(request)
-
-    # Map webhook events to relevant handler functions
-    # keys will match the names of webhooks coming from stripe
-    # while it's values will be actual methods inside the webhook handler
-    event_map = {
-        'payment_intent.succeeded': handler.handle_payment_intent_succeeded,
-        'payment_intent.payment_failed': handler.handle_payment_intent_payment_failed,
-    }
+    # Queue the event to be processed by the process_webhooks command,
+    # replying to stripe straight away so it's not kept waiting
+    if settings.STRIPE_WH_QUEUE:
+        enqueue_event(event, payload)
+        return HttpResponse(
+            content=f'Webhook received: {event["type"]} | Queued',
+            status=200)
 
-    # Get the webhook event type from Stripe
-    # Will return something along the lines of "payment_intent.succeeded" or
-    # "payment_intent.payment_failed"
-    event_type = event['type']
-
-    # Look up key in event_map dictionary above and assign it's value
-    # to a variable called event_handler
-    event_handler = event_map.get(event_type, handler.handle_event)
-
-    # Call the event handler with the event
-    # event_handler is nothing more than an alias for whatever function is pulled
-    # from the event_map dictionary, that means we can call it
-    # here we're getting the reponse from the event_handler and passing it the event
-    response = event_handler(event)
+    # Otherwise, create instance of the stripe web hook handler
+    # & handle the event now
+    handler = StripeWH_Handler(request)
 
-    # Return the response to stripe
-    return response
\ No newline at end of file
+    # Return the handler's response to stripe
+    return handler.dispatch(event)
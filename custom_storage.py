@@ -1,16 +1,68 @@
+import re
+
 from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin
 from storages.backends.s3boto3 import S3Boto3Storage
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Static files saved with a hash of their contents in the name,
+# e.g base.1a2b3c4d5e6f.css, a new version always gets a new name
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+# Hashed files never change, so browsers can keep them forever
+# without checking back, anything else is only cached briefly
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SHORT_CACHE_CONTROL = 'public, max-age=60'
 
 
-class StaticStorage(S3Boto3Storage):
+class StaticStorage(ManifestFilesMixin, S3Boto3Storage):
     """
     Tell's django where to store static files
+
+    Files are saved under a name containing a hash of their contents,
+    with a manifest of original to hashed names. Text files are gzipped
+    before they're uploaded, so S3 serves them compressed.
+    """
+    location = getattr(settings, 'STATICFILES_LOCATION', 'static')
+    gzip = True
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if HASHED_NAME.search(name):
+            params['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            params['CacheControl'] = SHORT_CACHE_CONTROL
+        # The hashed name is what stops browsers using an old
+        # version, so the far future Expires header isn't needed
+        params.pop('Expires', None)
+        return params
+
+    def url(self, name, force=False):
+        # DEBUG is on, which would otherwise give the unhashed name
+        return super().url(name, force=True)
+
+
+class LocalStaticStorage(CompressedManifestStaticFilesStorage):
     """
-    location = settings.STATICFILES_LOCATION
+    Static files served by whitenoise when we're not using S3
+
+    As well as hashing the names, gzip & brotli versions of each file
+    are saved by collectstatic, and whitenoise serves whichever the
+    browser accepts with far future cache headers for hashed files
+    """
+    # Files missing from the manifest get their unhashed name rather
+    # than an error, e.g a new file before collectstatic is re-run
+    manifest_strict = False
+
+    def url(self, name, force=False):
+        # DEBUG is on, which would otherwise give the unhashed name.
+        # Without a manifest (collectstatic hasn't been run) there
+        # are no hashed names to give
+        return super().url(name, force=bool(self.hashed_files))
 
 
 class MediaStorage(S3Boto3Storage):
     """
     Tell's django where to store media files
     """
-    location = settings.MEDIAFILES_LOCATION
+    location = getattr(settings, 'MEDIAFILES_LOCATION', 'media')
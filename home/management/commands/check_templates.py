@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.templates_warmup import compile_templates
+
+
+class Command(BaseCommand):
+    help = 'Compile every template, failing if any of them have errors'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        compiled, errors = compile_templates()
+        duration = time.monotonic() - start
+
+        for name, error in errors:
+            self.stderr.write(f'{name}: {error}')
+
+        if errors:
+            raise CommandError(f'{len(errors)} templates failed to compile')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Compiled {compiled} templates in {duration:.2f}s'))
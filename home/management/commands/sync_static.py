@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from home.static_sync import get_s3_client, sync_static
+
+
+class Command(BaseCommand):
+    help = ('Upload the static files that have changed since the last sync to S3, '
+            'in place of collectstatic')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=16,
+            help='How many files to upload at the same time')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Upload every file, even those that are unchanged')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="List the files that would be uploaded without uploading them")
+
+    def handle(self, *args, **options):
+        if not hasattr(settings, 'AWS_STORAGE_BUCKET_NAME'):
+            raise CommandError('Static files are only synced to S3, set USE_AWS to use it')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        start = time.monotonic()
+        client = get_s3_client(options['workers'])
+        changed, unchanged = sync_static(
+            client,
+            settings.AWS_STORAGE_BUCKET_NAME,
+            settings.STATICFILES_LOCATION,
+            max_workers=options['workers'],
+            force=options['force'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['verbosity'] > 1 or options['dry_run']:
+            for name in changed:
+                self.stdout.write(name)
+
+        verb = 'Would upload' if options['dry_run'] else 'Uploaded'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(changed)} files, {unchanged} unchanged '
+            f'in {time.monotonic() - start:.1f}s'))
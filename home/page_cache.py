@@ -0,0 +1,138 @@
+"""
+A full page cache for catalog pages viewed by anonymous visitors.
+
+Apart from the bag total in the nav, the toasts & the CSRF tokens in
+forms, the home page & catalog pages are the same for every anonymous
+visitor. Those pages are rendered without them (bag_contents returns an
+empty bag when request.page_cache_render is set, and the toasts are
+left out), stored in the cache & served to every anonymous visitor
+without touching the templates or, for visitors without a session,
+the database. A small script on the page then fills in the bag total,
+toasts & CSRF token from the bag_summary view.
+
+The CSRF token must never be cached, or every anonymous visitor would
+share the first visitor's CSRF secret. The csrf_placeholder context
+processor puts CSRF_PLACEHOLDER in the cached page's forms instead, and
+a page that asked for a real token while it was rendered isn't cached.
+
+Pages are cached for PAGE_CACHE_SECONDS. Changes to the catalog clear
+this process's cached pages straight away, other processes see them
+once their copy expires.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+GENERATION_KEY = 'page_cache:generation'
+
+# Put in forms instead of the CSRF token in cached pages,
+# until the script replaces it with the visitor's own token
+CSRF_PLACEHOLDER = 'page-cache-csrf-placeholder'
+
+
+def _generation():
+    """
+    Every cached page's key includes the generation,
+    so changing it means none of them are found again
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = time.time_ns()
+        cache.set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def clear_page_cache():
+    """
+    Stop serving the pages cached so far
+    """
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def csrf_placeholder(request):
+    """
+    Context processor that replaces the CSRF token with a
+    placeholder in pages rendered for the page cache.
+    It runs after django's own csrf context processor, so it
+    wins, and the visitor's token is never generated or rendered.
+    """
+    if getattr(request, 'page_cache_render', False):
+        return {'csrf_token': CSRF_PLACEHOLDER}
+    return {}
+
+
+def _can_use_cache(request):
+    """
+    Only GET requests from anonymous visitors are cached
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+
+    # No session means no user, bag or messages, so
+    # there's no need to load anything to check
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+
+    return not request.user.is_authenticated
+
+
+def _cached_response(request, content, content_type, etag):
+    """
+    Build the response for a page found in the cache
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return response
+
+
+def cache_anonymous_page(view):
+    """
+    Serve the view's page from the cache to anonymous visitors
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _can_use_cache(request):
+            return view(request, *args, **kwargs)
+
+        path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f'page_cache:{_generation()}:{path_hash}'
+
+        cached = cache.get(key)
+        if cached is not None:
+            response = _cached_response(request, *cached)
+        else:
+            # Render the page without anything specific to this visitor
+            request.page_cache_render = True
+            response = view(request, *args, **kwargs)
+
+            if response.status_code != 200 or response.streaming:
+                return response
+
+            # Something asked for this visitor's CSRF token while the
+            # page was rendered, so the page has to stay theirs alone
+            if request.META.get('CSRF_COOKIE_USED'):
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('Cookie',))
+                return response
+
+            # Only the page itself is kept, not headers such as cookies
+            etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+            cache.set(key, (response.content, response['Content-Type'], etag),
+                      settings.PAGE_CACHE_SECONDS)
+            response['ETag'] = etag
+
+        # The browser has to check back each time, as the bag & toasts
+        # are filled in separately. The page is the same for every
+        # anonymous visitor, but not for logged in users
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    return wrapper
@@ -0,0 +1,181 @@
+"""
+Upload the static files to S3, only sending the files that changed.
+
+collectstatic asks S3 about each file in turn and uploads them one at a
+time. Instead, the files are gathered & hashed into a local directory
+by the same manifest storage StaticStorage uses, and the sha256 of
+each file is compared to a manifest of what was uploaded last time,
+which is stored alongside the files. Only new & changed files are
+uploaded, in parallel over a single boto3 client (clients are thread
+safe, and share one connection pool).
+
+Django's staticfiles.json manifest is uploaded after everything else,
+so the site never refers to a hashed file that isn't there yet.
+Files that are no longer used are left in place, as pages served by
+the previous deploy may still refer to them.
+
+Everything goes through the client passed in, so it can be pointed at
+a local stand-in for S3 such as moto.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from custom_storage import HASHED_NAME, IMMUTABLE_CACHE_CONTROL, SHORT_CACHE_CONTROL
+
+# Lists the sha256 of every file we've uploaded
+SYNC_MANIFEST_NAME = 'staticsync.json'
+
+# The same types StaticStorage gzips
+GZIP_CONTENT_TYPES = (
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+    'application/x-javascript',
+    'image/svg+xml',
+)
+
+IGNORE_PATTERNS = ['CVS', '.*', '*~']
+
+
+def get_s3_client(max_workers):
+    """
+    Return a boto3 client with enough connections for every worker
+    """
+    session = boto3.session.Session(
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+    return session.client(
+        's3',
+        endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None),
+        config=Config(max_pool_connections=max_workers),
+    )
+
+
+def build_static(build_dir):
+    """
+    Gather the static files into build_dir & give them hashed names,
+    in the same way collectstatic does for StaticStorage.
+    Returns the storage the files were built into
+    """
+    storage = ManifestStaticFilesStorage(location=build_dir, base_url=settings.STATIC_URL)
+
+    found = {}
+    for finder in get_finders():
+        for path, source_storage in finder.list(IGNORE_PATTERNS):
+            prefix = getattr(source_storage, 'prefix', None)
+            name = os.path.join(prefix, path) if prefix else path
+            # As with collectstatic, the first finder to find a file wins
+            if name not in found:
+                found[name] = (source_storage, path)
+                with source_storage.open(path) as source_file:
+                    storage.save(name, source_file)
+
+    for name, hashed_name, processed in storage.post_process(found):
+        if isinstance(processed, Exception):
+            raise processed
+
+    return storage
+
+
+def hash_files(build_dir):
+    """
+    Return a dict of {file name: sha256} for every file in build_dir
+    """
+    hashes = {}
+    for root, dirs, files in os.walk(build_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, build_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                hashes[name] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def read_sync_manifest(client, bucket, location):
+    """
+    Return the hashes of the files uploaded last time
+    """
+    try:
+        response = client.get_object(
+            Bucket=bucket, Key=f'{location}/{SYNC_MANIFEST_NAME}')
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return {}
+        raise
+    return json.loads(response['Body'].read())
+
+
+def _upload(client, bucket, location, build_dir, name):
+    """
+    Upload one file with the same headers StaticStorage would give it
+    """
+    with open(os.path.join(build_dir, name), 'rb') as f:
+        body = f.read()
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    params = {
+        'ContentType': content_type,
+        'CacheControl': (IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(name)
+                         else SHORT_CACHE_CONTROL),
+    }
+    if content_type in GZIP_CONTENT_TYPES:
+        # mtime=0 means the same file always compresses to the same bytes
+        body = gzip.compress(body, mtime=0)
+        params['ContentEncoding'] = 'gzip'
+
+    client.put_object(Bucket=bucket, Key=f'{location}/{name}', Body=body, **params)
+    return name
+
+
+def sync_static(client, bucket, location, max_workers=16, force=False, dry_run=False):
+    """
+    Build the static files and upload the ones that have changed,
+    returning a tuple of (the names uploaded, the number unchanged)
+    """
+    with tempfile.TemporaryDirectory() as build_dir:
+        storage = build_static(build_dir)
+        hashes = hash_files(build_dir)
+
+        uploaded = {} if force else read_sync_manifest(client, bucket, location)
+        changed = sorted(
+            name for name, digest in hashes.items() if uploaded.get(name) != digest)
+
+        # The manifest tells the site which hashed files to use,
+        # so it's held back until they're all uploaded
+        manifest_last = [name for name in changed if name == storage.manifest_name]
+        changed = [name for name in changed if name != storage.manifest_name]
+
+        if not dry_run:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # list() raises the first upload error, if there was one
+                list(executor.map(
+                    lambda name: _upload(client, bucket, location, build_dir, name),
+                    changed))
+
+            for name in manifest_last:
+                _upload(client, bucket, location, build_dir, name)
+
+            client.put_object(
+                Bucket=bucket,
+                Key=f'{location}/{SYNC_MANIFEST_NAME}',
+                Body=json.dumps(hashes).encode('utf-8'),
+                ContentType='application/json',
+                CacheControl='no-cache',
+            )
+
+    return changed + manifest_last, len(hashes) - len(changed) - len(manifest_last)
@@ -0,0 +1,82 @@
+"""
+Find & compile every template the site can load.
+
+With the cached template loader, a template is only read from disk and
+compiled the first time it's used in each process. Warming the cache
+when the process starts means the first customers don't pay for it,
+and compiling everything up front catches template syntax errors
+before they reach a page.
+"""
+import logging
+import os
+
+from django.template import engines
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def _template_dirs(engine):
+    """
+    Return every directory the engine's loaders look in
+    """
+    dirs = []
+    for loader in engine.template_loaders:
+        # The cached loader wraps the loaders that do the reading
+        for inner_loader in getattr(loader, 'loaders', [loader]):
+            if hasattr(inner_loader, 'get_dirs'):
+                dirs.extend(inner_loader.get_dirs())
+    return dirs
+
+
+def iter_template_names():
+    """
+    Yield the name of every template in the template directories
+    """
+    engine = engines['django'].engine
+    seen = set()
+
+    for template_dir in _template_dirs(engine):
+        for root, subdirs, files in os.walk(template_dir):
+            for filename in files:
+                if not filename.endswith(TEMPLATE_EXTENSIONS):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename), template_dir)
+                name = name.replace(os.sep, '/')
+                if name not in seen:
+                    seen.add(name)
+                    yield name
+
+
+def compile_templates():
+    """
+    Load every template, returning a tuple of (the number compiled,
+    a list of (template name, error) for any that failed)
+    """
+    engine = engines['django'].engine
+    compiled = 0
+    errors = []
+
+    for name in iter_template_names():
+        try:
+            engine.get_template(name)
+        except Exception as e:
+            # Usually a TemplateSyntaxError, but templates from other apps
+            # can also fail on e.g a tag library that isn't installed
+            errors.append((name, e))
+        else:
+            compiled += 1
+
+    return compiled, errors
+
+
+def warm_templates():
+    """
+    Fill the cached loader with every template, logging any that fail
+    """
+    compiled, errors = compile_templates()
+    for name, error in errors:
+        logger.warning('Template %s failed to compile: %s', name, error)
+    logger.info('Warmed %s templates', compiled)
+    return compiled
@@ -1,3 +1,99 @@
-from django.test import TestCase
+import json
+from unittest import skipUnless
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+import boto3
+
+from .static_sync import SYNC_MANIFEST_NAME, sync_static
+
+try:
+    from moto import mock_s3
+except ImportError:
+    mock_s3 = None
+
+BUCKET = 'test-static'
+LOCATION = 'static'
+
+
+# moto isn't needed by the site itself, so these
+# only run where it's installed (pip install moto)
+@skipUnless(mock_s3, 'moto is not installed')
+class SyncStaticTests(SimpleTestCase):
+
+    def setUp(self):
+        s3 = mock_s3()
+        s3.start()
+        self.addCleanup(s3.stop)
+
+        self.client = boto3.client(
+            's3', region_name='us-east-1',
+            aws_access_key_id='testing', aws_secret_access_key='testing')
+        self.client.create_bucket(Bucket=BUCKET)
+
+    def _sync(self, **kwargs):
+        return sync_static(self.client, BUCKET, LOCATION, max_workers=4, **kwargs)
+
+    def _keys(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        return {
+            item['Key']
+            for page in paginator.paginate(Bucket=BUCKET)
+            for item in page.get('Contents', [])
+        }
+
+    def _sync_manifest(self):
+        response = self.client.get_object(
+            Bucket=BUCKET, Key=f'{LOCATION}/{SYNC_MANIFEST_NAME}')
+        return json.loads(response['Body'].read())
+
+    def test_first_sync_uploads_everything_with_the_manifest_last(self):
+        uploaded, unchanged = self._sync()
+
+        self.assertEqual(unchanged, 0)
+        self.assertEqual(uploaded[-1], 'staticfiles.json')
+        self.assertEqual(
+            self._keys(),
+            {f'{LOCATION}/{name}' for name in uploaded}
+            | {f'{LOCATION}/{SYNC_MANIFEST_NAME}'})
+        self.assertEqual(set(self._sync_manifest()), set(uploaded))
+
+    def test_hashed_css_is_gzipped_and_cached_forever(self):
+        self._sync()
+        manifest = json.loads(self.client.get_object(
+            Bucket=BUCKET, Key=f'{LOCATION}/staticfiles.json')['Body'].read())
+        hashed_name = manifest['paths']['css/base.css']
+
+        head = self.client.head_object(Bucket=BUCKET, Key=f'{LOCATION}/{hashed_name}')
+
+        self.assertEqual(head['ContentEncoding'], 'gzip')
+        self.assertIn('immutable', head['CacheControl'])
+
+    def test_unchanged_files_are_not_uploaded_again(self):
+        first, _ = self._sync()
+
+        uploaded, unchanged = self._sync()
+
+        self.assertEqual(uploaded, [])
+        self.assertEqual(unchanged, len(first))
+
+    def test_only_changed_files_are_uploaded(self):
+        self._sync()
+
+        # Make it look like base.css changed since the last sync
+        hashes = self._sync_manifest()
+        hashes['css/base.css'] = 'changed'
+        self.client.put_object(
+            Bucket=BUCKET, Key=f'{LOCATION}/{SYNC_MANIFEST_NAME}',
+            Body=json.dumps(hashes).encode('utf-8'))
+
+        uploaded, unchanged = self._sync()
+
+        self.assertEqual(uploaded, ['css/base.css'])
+        self.assertEqual(unchanged, len(hashes) - 1)
+
+    def test_dry_run_uploads_nothing(self):
+        uploaded, unchanged = self._sync(dry_run=True)
+
+        self.assertTrue(uploaded)
+        self.assertEqual(self._keys(), set())
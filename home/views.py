@@ -1,7 +1,10 @@
 from django.shortcuts import render
+from .page_cache import cache_anonymous_page
 
 # Create your views here.
 
+# Anonymous visitors are served the home page from the page cache
+@cache_anonymous_page
 def index(request):
     """
     View to return index page
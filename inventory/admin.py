@@ -0,0 +1,36 @@
+from django.contrib import admin
+
+from .models import StockLevel, StockReservation
+
+
+class StockLevelAdmin(admin.ModelAdmin):
+    list_display = ('variant', 'quantity')
+
+    list_select_related = ('variant__product',)
+
+    # There's a variant for each size of every product, too many to list
+    raw_id_fields = ('variant',)
+    search_fields = ('variant__product__name', 'variant__product__sku')
+
+    ordering = ('variant__product__sku', 'variant__size')
+
+
+class StockReservationAdmin(admin.ModelAdmin):
+    # Reservations are made by the checkout, so they're read-only here
+    list_display = ('stripe_pid', 'stock_level', 'quantity',
+                    'status', 'expires_at')
+
+    list_filter = ('status',)
+
+    list_select_related = ('stock_level__variant__product',)
+
+    search_fields = ('=stripe_pid',)
+
+    readonly_fields = ('stripe_pid', 'stock_level', 'quantity',
+                       'status', 'expires_at', 'created')
+
+    ordering = ('-created',)
+
+
+admin.site.register(StockLevel, StockLevelAdmin)
+admin.site.register(StockReservation, StockReservationAdmin)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from checkout.models import PendingCheckout
+from inventory.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = ('Put back the stock held by checkouts that were never paid for '
+            'and delete their stale pending checkouts')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of reservations to release at a time')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            # Running for days, the connection may have been
+            # dropped by the database between sweeps
+            close_old_connections()
+            released = release_expired_reservations(options['batch_size'])
+            self.stdout.write(f'Released {released} expired reservations')
+
+            # Checkouts that were never paid for don't need their bags kept
+            deleted = PendingCheckout.delete_stale()
+            if deleted:
+                self.stdout.write(f'Deleted {deleted} stale pending checkouts')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
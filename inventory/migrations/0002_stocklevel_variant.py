@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_create_product_variants'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        # Nullable to begin with, it's filled in by the next migration.
+        # The product is made nullable too, so going back the other way
+        # it can be added back empty & filled in from the variant
+        migrations.AlterField(
+            model_name='stocklevel',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='products.product'),
+        ),
+        migrations.AddField(
+            model_name='stocklevel',
+            name='variant',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_level', to='products.productvariant'),
+        ),
+    ]
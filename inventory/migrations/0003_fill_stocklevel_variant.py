@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def fill_variants(apps, schema_editor):
+    """
+    Point every stock level at the variant for it's product & size,
+    creating the variant if the product doesn't have that size yet
+    """
+    StockLevel = apps.get_model("inventory", "StockLevel")
+    ProductVariant = apps.get_model("products", "ProductVariant")
+
+    for stock_level in StockLevel.objects.only("pk", "product_id", "size").iterator():
+        variant, _ = ProductVariant.objects.get_or_create(
+            product_id=stock_level.product_id, size=stock_level.size)
+        StockLevel.objects.filter(pk=stock_level.pk).update(variant=variant)
+
+
+def fill_products(apps, schema_editor):
+    """
+    Put each stock level's product & size back from it's variant
+    """
+    StockLevel = apps.get_model("inventory", "StockLevel")
+
+    for stock_level in StockLevel.objects.select_related("variant").iterator():
+        StockLevel.objects.filter(pk=stock_level.pk).update(
+            product_id=stock_level.variant.product_id, size=stock_level.variant.size)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_stocklevel_variant"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_variants, fill_products),
+    ]
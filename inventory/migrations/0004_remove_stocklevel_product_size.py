@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_fill_stocklevel_variant'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='stocklevel',
+            name='unique_stock_level',
+        ),
+        migrations.RemoveField(
+            model_name='stocklevel',
+            name='product',
+        ),
+        migrations.RemoveField(
+            model_name='stocklevel',
+            name='size',
+        ),
+        migrations.AlterField(
+            model_name='stocklevel',
+            name='variant',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_level', to='products.productvariant'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import models
+
+from products.models import ProductVariant
+
+# Flow of these models
+# 1. When the customer confirms their payment, the cache_checkout_data view
+# reserves the stock for everything in their bag, taking it off the stock level
+# 2. When stripe tells us the payment succeeded, the reservations are confirmed
+# 3. If the payment fails, or is never made, the reservations are released
+# and the stock is put back
+
+
+class StockLevel(models.Model):
+    """
+    The quantity of a product variant (a product in a particular size)
+    available to buy. Variants without a stock level aren't tracked &
+    never run out.
+    """
+
+    class Meta:
+        constraints = [
+            # The database itself refuses to let the stock go below zero
+            models.CheckConstraint(check=models.Q(quantity__gte=0),
+                                   name='stock_level_quantity_gte_0'),
+        ]
+
+    # Keyed on the variant, as the bag is, so the stock for
+    # everything in a bag can be found straight from the bag's keys.
+    # A variant has one stock level
+    variant = models.OneToOneField(ProductVariant, on_delete=models.CASCADE,
+                                   related_name='stock_level')
+
+    quantity = models.IntegerField(default=0)
+
+    def __str__(self):
+        return str(self.variant)
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a checkout while the customer pays
+    """
+
+    HELD = 'held'
+    CONFIRMED = 'confirmed'
+    RELEASED = 'released'
+
+    STATUS_CHOICES = (
+        (HELD, 'Held'),
+        (CONFIRMED, 'Confirmed'),
+        (RELEASED, 'Released'),
+    )
+
+    class Meta:
+        # The sweeper looks for held reservations that have expired
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    # The stripe payment intent ID of the checkout holding the stock
+    stripe_pid = models.CharField(max_length=254, db_index=True)
+
+    stock_level = models.ForeignKey(StockLevel, on_delete=models.CASCADE,
+                                    related_name='reservations')
+    quantity = models.IntegerField()
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.stock_level} for {self.stripe_pid}'
@@ -0,0 +1,184 @@
+"""
+Reserve, confirm & release stock for checkouts.
+
+Stock is taken with a conditional update, e.g
+UPDATE ... SET quantity = quantity - 2 WHERE id = 1 AND quantity >= 2
+so the database checks & decrements in one step and two checkouts can
+never both take the last item.
+
+To avoid deadlocks, everything locks rows in the same order: a
+checkout's reservations first, then the stock levels it touches, in id
+order. reserve_bag locks every stock level it's going to change (the
+ones it puts back & the ones it takes) up front in a single query, so
+a checkout resubmitted with a different bag can't lock them in a
+different order to another checkout.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import StockLevel, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    """There isn't enough stock to reserve everything in the bag"""
+
+    def __init__(self, stock_level):
+        self.stock_level = stock_level
+        super().__init__(f'Not enough stock of {stock_level}')
+
+
+def _bag_quantities(bag):
+    """
+    Return the quantity of each variant in the bag, as a dict
+    of {variant_id: quantity}. The bag is already keyed on variant
+    ids, so these are the stock levels' keys too.
+    """
+    return {int(variant_id): quantity for variant_id, quantity in bag.items()}
+
+
+def _take_stock(stock_level_id, quantity):
+    """
+    Take stock if there's enough of it, returning whether it was taken
+    """
+    return StockLevel.objects.filter(
+        pk=stock_level_id, quantity__gte=quantity,
+    ).update(quantity=F('quantity') - quantity) == 1
+
+
+def _return_stock(reservation_id):
+    """
+    Put a held reservation's stock back. The reservation is only
+    released if it's still held, so stock is never returned twice.
+    """
+    reservation = StockReservation.objects.get(pk=reservation_id)
+    released = StockReservation.objects.filter(
+        pk=reservation_id, status=StockReservation.HELD,
+    ).update(status=StockReservation.RELEASED)
+    if released:
+        StockLevel.objects.filter(pk=reservation.stock_level_id).update(
+            quantity=F('quantity') + reservation.quantity)
+    return bool(released)
+
+
+def reserve_bag(stripe_pid, bag):
+    """
+    Reserve the stock for everything in the bag for a checkout,
+    replacing any reservations the checkout already has.
+    Raises OutOfStock, without reserving anything, if any
+    item doesn't have enough stock.
+    """
+    quantities = _bag_quantities(bag)
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+
+    with transaction.atomic():
+        # Lock the reservations the checkout already holds, from
+        # submitting the checkout before, then every stock level
+        # this changes in id order, before changing any of them
+        held = list(
+            StockReservation.objects.select_for_update()
+            .filter(stripe_pid=stripe_pid, status=StockReservation.HELD)
+            .order_by('pk').values_list('stock_level_id', flat=True))
+
+        # Only variants with a stock level are tracked
+        stock_levels = {
+            stock_level.variant_id: stock_level
+            for stock_level in StockLevel.objects.select_for_update()
+            .filter(Q(variant_id__in=list(quantities)) | Q(pk__in=held))
+            .order_by('pk')
+        }
+
+        # Put back anything they already have reserved.
+        # Those reservations are replaced by this one, so they're removed
+        release_reservations(stripe_pid)
+        StockReservation.objects.filter(
+            stripe_pid=stripe_pid, status=StockReservation.RELEASED).delete()
+
+        reservations = []
+        tracked = [(stock_levels[key], quantity)
+                   for key, quantity in quantities.items() if key in stock_levels]
+
+        # Take the stock in id order too
+        for stock_level, quantity in sorted(tracked, key=lambda item: item[0].pk):
+            if not _take_stock(stock_level.pk, quantity):
+                # Leaving the atomic block with an exception
+                # undoes the stock already taken for this bag
+                raise OutOfStock(stock_level)
+
+            reservations.append(StockReservation(
+                stripe_pid=stripe_pid,
+                stock_level=stock_level,
+                quantity=quantity,
+                expires_at=expires_at,
+            ))
+
+        StockReservation.objects.bulk_create(reservations)
+
+    return reservations
+
+
+def confirm_reservations(stripe_pid):
+    """
+    The checkout has been paid for, so it's stock is sold.
+    Reservations that expired before the payment arrived have had
+    their stock put back, so we try to take it again.
+    """
+    with transaction.atomic():
+        StockReservation.objects.filter(
+            stripe_pid=stripe_pid, status=StockReservation.HELD,
+        ).update(status=StockReservation.CONFIRMED)
+
+        expired = StockReservation.objects.filter(
+            stripe_pid=stripe_pid, status=StockReservation.RELEASED,
+        ).order_by('stock_level_id')
+
+        for reservation in expired:
+            if not _take_stock(reservation.stock_level_id, reservation.quantity):
+                # The stock has gone to another customer in the meantime
+                logger.warning('Oversold %s for %s', reservation.stock_level, stripe_pid)
+            reservation.status = StockReservation.CONFIRMED
+            reservation.save(update_fields=['status'])
+
+
+def release_reservations(stripe_pid):
+    """
+    Put back all of the stock held for a checkout
+    """
+    reservation_ids = StockReservation.objects.filter(
+        stripe_pid=stripe_pid, status=StockReservation.HELD,
+    ).order_by('stock_level_id').values_list('pk', flat=True)
+
+    with transaction.atomic():
+        for reservation_id in reservation_ids:
+            _return_stock(reservation_id)
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Put back the stock held by checkouts that were never paid for,
+    returning how many reservations were released
+    """
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.filter(
+                status=StockReservation.HELD, expires_at__lte=timezone.now(),
+            ).order_by('stock_level_id')
+
+            # Skip reservations another sweeper or checkout is working on
+            if connection.features.has_select_for_update_skip_locked:
+                expired = expired.select_for_update(skip_locked=True)
+
+            reservation_ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            for reservation_id in reservation_ids:
+                released += _return_stock(reservation_id)
+
+        if len(reservation_ids) < batch_size:
+            return released
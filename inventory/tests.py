@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from products.models import Product, ProductVariant
+
+from .models import StockLevel, StockReservation
+from .reservations import OutOfStock, release_reservations, reserve_bag
+
+
+class ReserveBagTests(TestCase):
+
+    def setUp(self):
+        product = Product.objects.create(name='Shirt', description='A shirt', price=10)
+        self.small = ProductVariant.objects.create(product=product, size='s')
+        self.large = ProductVariant.objects.create(product=product, size='l')
+        # Only the small shirt's stock is tracked
+        self.stock = StockLevel.objects.create(variant=self.small, quantity=2)
+
+    def _bag(self, **quantities):
+        return {str(getattr(self, name).pk): quantity
+                for name, quantity in quantities.items()}
+
+    def test_takes_the_stock_of_the_variant_in_the_bag(self):
+        reservations = reserve_bag('pi_1', self._bag(small=2, large=5))
+
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 0)
+        # The large shirt isn't tracked, so nothing is reserved for it
+        self.assertEqual([r.stock_level for r in reservations], [self.stock])
+
+    def test_refuses_more_than_is_in_stock(self):
+        reserve_bag('pi_1', self._bag(small=1))
+
+        with self.assertRaises(OutOfStock):
+            reserve_bag('pi_2', self._bag(small=2))
+
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 1)
+        self.assertFalse(StockReservation.objects.filter(stripe_pid='pi_2').exists())
+
+    def test_resubmitting_replaces_the_reservation(self):
+        reserve_bag('pi_1', self._bag(small=2))
+
+        reserve_bag('pi_1', self._bag(small=1))
+
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 1)
+        self.assertEqual(StockReservation.objects.filter(stripe_pid='pi_1').count(), 1)
+
+    def test_releasing_puts_the_stock_back(self):
+        reserve_bag('pi_1', self._bag(small=2))
+
+        release_reservations('pi_1')
+
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
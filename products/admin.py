@@ -1,10 +1,19 @@
 from django.contrib import admin
-from .models import Product, Category
+from .models import Product, ProductVariant, Category
 
 # Register your models here.
 
+class ProductVariantAdminInline(admin.TabularInline):
+    # Shows the sizes the product is available in
+    # They're created automatically when the product is saved
+    model = ProductVariant
+    extra = 0
+
+
 class ProductAdmin(admin.ModelAdmin):
 
+    inlines = (ProductVariantAdminInline,)
+
     # Change list display in admin to
     # friendly names instead of programmatic ones
     list_display = (
@@ -16,11 +25,19 @@ class ProductAdmin(admin.ModelAdmin):
         "image"
     )
 
+    # Get each product's category in the same query as the
+    # products, rather than a query for each row
+    list_select_related = ("category",)
+
     # sort products by sku using ordering attribute
     # has to be tuple despite giving one parameter
     # adding a - before sku reverses it
     ordering = ("sku",)
 
+    # Allows products to be searched for, which is also used
+    # by the product autocomplete on order line items
+    search_fields = ("name", "sku")
+
 class CategoryAdmin(admin.ModelAdmin):
 
     # Change list display in admin to
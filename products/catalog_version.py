@@ -0,0 +1,92 @@
+"""
+Conditional GETs (ETag & Last-Modified) for catalog pages.
+
+A catalog page only changes when the catalog does, or when something
+specific to the visitor does: what's in their bag, who they're logged
+in as, their CSRF token (which is in the page's forms) and any messages
+waiting to be shown. The ETag combines all of them with the catalog
+version, so a browser sending it back gets a 304 instead of the page
+as long as none of them have changed.
+
+Last-Modified is the time the catalog last changed. It can't describe
+changes to the bag, so it's only given to visitors with an empty bag
+who aren't logged in.
+"""
+import hashlib
+import json
+
+from django.contrib.messages import get_messages
+from django.db.models import F
+from django.utils import timezone
+
+from bag.utils import get_bag
+from home.page_cache import clear_page_cache
+
+from .models import CatalogVersion
+
+
+def get_catalog_version():
+    """
+    Return the catalog version, creating it if it doesn't exist yet
+    """
+    catalog_version = CatalogVersion.objects.order_by('pk').first()
+    if catalog_version is None:
+        catalog_version = CatalogVersion.objects.create()
+    return catalog_version
+
+
+def bump_catalog_version():
+    """
+    Record that the catalog has changed
+    The update is atomic, so bumps from different processes aren't lost
+    """
+    updated = CatalogVersion.objects.update(
+        version=F('version') + 1, updated=timezone.now())
+    if not updated:
+        CatalogVersion.objects.create(version=1)
+
+    # The cached catalog pages are now out of date
+    clear_page_cache()
+
+
+def _request_catalog_version(request):
+    """
+    The catalog version, read once per request as the ETag &
+    Last-Modified functions both need it
+    """
+    if not hasattr(request, '_catalog_version'):
+        request._catalog_version = get_catalog_version()
+    return request._catalog_version
+
+
+def _has_messages(request):
+    # len() doesn't mark the messages as read, unlike looping over them
+    return len(get_messages(request)) > 0
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    The ETag of a catalog page for this visitor, or None if the page
+    has to be rendered anyway to show them a message
+    """
+    if _has_messages(request):
+        return None
+
+    catalog_version = _request_catalog_version(request)
+    parts = [
+        catalog_version.version,
+        request.user.pk,
+        request.META.get('CSRF_COOKIE', ''),
+        json.dumps(get_bag(request), sort_keys=True),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    """
+    When the catalog last changed, for visitors whose
+    pages only depend on the catalog
+    """
+    if _has_messages(request) or request.user.is_authenticated or get_bag(request):
+        return None
+    return _request_catalog_version(request).updated
@@ -0,0 +1,72 @@
+"""
+An in-process registry of categories.
+
+There are only a handful of categories and they rarely change, so
+rather than query them each time a form, the admin or the product
+list needs them, they're loaded once & kept in memory.
+The registry is cleared by signals whenever a category is saved or
+deleted. Other processes can't see that signal, so the registry is
+also reloaded every CATEGORY_CACHE_TIMEOUT seconds.
+"""
+import threading
+import time
+
+from boutique_ado.db_routing import use_primary
+
+from .models import Category
+
+CATEGORY_CACHE_TIMEOUT = 300
+
+_categories = None
+_loaded_at = 0
+_lock = threading.Lock()
+
+
+def _is_stale(categories):
+    return categories is None or time.monotonic() - _loaded_at > CATEGORY_CACHE_TIMEOUT
+
+
+def get_categories():
+    """
+    Return every category, loading them if they're not cached
+    """
+    global _categories, _loaded_at
+
+    categories = _categories
+    if _is_stale(categories):
+        with _lock:
+            # Another thread may have reloaded it while we waited for
+            # the lock, in which case there's no need to load it again
+            categories = _categories
+            if _is_stale(categories):
+                # Kept for minutes, so always loaded from the primary
+                with use_primary():
+                    categories = tuple(Category.objects.order_by('pk'))
+                _categories = categories
+                _loaded_at = time.monotonic()
+
+    return categories
+
+
+def get_category_choices():
+    """
+    Return a list of tuples of each category's id & friendly name
+    for use as the choices of a category field
+    """
+    return [(c.id, c.get_friendly_name()) for c in get_categories()]
+
+
+def get_categories_by_name(names):
+    """
+    Return the categories with the given programmatic names
+    """
+    names = set(names)
+    return [c for c in get_categories() if c.name in names]
+
+
+def clear_categories():
+    """
+    Empty the registry, so the categories are loaded again next time
+    """
+    global _categories
+    _categories = None
@@ -0,0 +1,149 @@
+"""
+Faceted filtering of the product list.
+
+Products can be filtered by category, price band, rating band and
+whether they have sizes. Picking several values of one facet shows
+products matching any of them, while picking values from different
+facets only shows products matching all of them.
+
+Each facet value shows how many products it would match. Rather than
+count each value separately, every count is a conditional aggregate,
+e.g COUNT(id) FILTER (WHERE price < 25), so all of them are worked out
+by one query however many facets & values there are. Each facet's
+counts ignore that facet's own selection, so picking a price band
+still shows how many products are in the other bands.
+"""
+from django.db.models import Count, Q
+
+from .categories import get_categories
+
+# Each facet value is a tuple of (key used in the url, label, filter)
+PRICE_BANDS = (
+    ('0-25', 'Under $25', Q(price__lt=25)),
+    ('25-50', '$25 to $50', Q(price__gte=25, price__lt=50)),
+    ('50-100', '$50 to $100', Q(price__gte=50, price__lt=100)),
+    ('100-', '$100 & over', Q(price__gte=100)),
+)
+
+RATING_BANDS = (
+    ('4', '4 stars & up', Q(rating__gte=4)),
+    ('3', '3 to 4 stars', Q(rating__gte=3, rating__lt=4)),
+    ('0', 'Under 3 stars', Q(rating__lt=3)),
+    ('none', 'No rating', Q(rating__isnull=True)),
+)
+
+SIZE_OPTIONS = (
+    ('yes', 'Has sizes', Q(has_sizes=True)),
+    ('no', 'One size', Q(has_sizes=False) | Q(has_sizes__isnull=True)),
+)
+
+
+def get_facets():
+    """
+    Return a list of (name, label, values) for each facet.
+    The category values come from the category registry, so
+    adding a category adds it to the facets.
+    """
+    categories = tuple(
+        (c.name, c.get_friendly_name() or c.name, Q(category_id=c.id))
+        for c in get_categories()
+    )
+    return [
+        ('category', 'Category', categories),
+        ('price', 'Price', PRICE_BANDS),
+        ('rating', 'Rating', RATING_BANDS),
+        ('sizes', 'Sizes', SIZE_OPTIONS),
+    ]
+
+
+def get_selected(query_dict, facets):
+    """
+    Return a dict of {facet name: [selected keys]} from the
+    comma separated values in the query string, ignoring unknown keys
+    """
+    selected = {}
+    for name, label, values in facets:
+        keys = {key for key, value_label, value_filter in values}
+        chosen = [key for key in query_dict.get(name, '').split(',') if key in keys]
+        if chosen:
+            selected[name] = chosen
+    return selected
+
+
+def _facets_filter(facets, selected, exclude=None):
+    """
+    Build a filter matching the selected values of every facet
+    apart from the excluded one
+    """
+    combined = Q()
+    for name, label, values in facets:
+        if name == exclude or name not in selected:
+            continue
+
+        facet_filter = Q()
+        for key, value_label, value_filter in values:
+            if key in selected[name]:
+                facet_filter |= value_filter
+        combined &= facet_filter
+
+    return combined
+
+
+def filter_products(products, facets, selected):
+    """
+    Only include products matching the selected facet values
+    """
+    return products.filter(_facets_filter(facets, selected))
+
+
+def _toggle_url(query_dict, name, key):
+    """
+    Return the query string with the facet value added,
+    or removed if it's already selected
+    """
+    query_dict = query_dict.copy()
+    keys = [k for k in query_dict.get(name, '').split(',') if k]
+    if key in keys:
+        keys.remove(key)
+    else:
+        keys.append(key)
+
+    if keys:
+        query_dict[name] = ','.join(keys)
+    else:
+        query_dict.pop(name, None)
+
+    return f'?{query_dict.urlencode()}' if query_dict else '?'
+
+
+def facet_counts(products, facets, selected, query_dict):
+    """
+    Count the products matching each facet value in a single query,
+    returning the facets ready to be shown in the template
+    """
+    aggregates = {}
+    for name, label, values in facets:
+        others = _facets_filter(facets, selected, exclude=name)
+        for index, (key, value_label, value_filter) in enumerate(values):
+            aggregates[f'{name}_{index}'] = Count('pk', filter=value_filter & others)
+
+    # Counting doesn't need the list's ordering or joins
+    counts = products.order_by().aggregate(**aggregates) if aggregates else {}
+
+    return [
+        {
+            'name': name,
+            'label': label,
+            'values': [
+                {
+                    'key': key,
+                    'label': value_label,
+                    'count': counts[f'{name}_{index}'],
+                    'selected': key in selected.get(name, ()),
+                    'url': _toggle_url(query_dict, name, key),
+                }
+                for index, (key, value_label, value_filter) in enumerate(values)
+            ],
+        }
+        for name, label, values in facets
+    ]
@@ -1,6 +1,8 @@
 from django import forms
 from .widgets import CustomClearableFileInput
-from .models import Product, Category
+from .models import Product
+from .categories import get_category_choices
+from .uploads import InvalidUpload, validate_upload
 
 
 class ProductForm(forms.ModelForm):
@@ -15,19 +17,19 @@ class ProductForm(forms.ModelForm):
     # one we styled which utilizes the widget
     image = forms.ImageField(label='Image', required=False, widget=CustomClearableFileInput)
 
+    # The key of an image the browser has uploaded straight to storage
+    # When it's set, it's used instead of a posted image
+    image_key = forms.CharField(required=False, widget=forms.HiddenInput)
+
     def __init__(self, *args, **kwargs):
         """Override init method to make changes to fields"""
         super().__init__(*args, **kwargs)
 
         # We want the categories to show up in the form
         # Using friendly names
-        # Get all categories
-        categories = Category.objects.all()
-
-        # Create a list of tuples of the friendly names
-        # Associated with their category id's
-        # Using list comprehension
-        friendly_names = [(c.id, c.get_friendly_name()) for c in categories]
+        # Get a list of tuples of the friendly names associated with
+        # their category id's from the cached categories
+        friendly_names = get_category_choices()
 
         # Withfriendly names, update the category field on the form
         # Using those for choices instead of using the id
@@ -38,3 +40,23 @@ class ProductForm(forms.ModelForm):
         # of the rest of our store
         for field_name, field in self.fields.items():
             field.widget.attrs['class'] = 'border-black rounded-0'
+
+    def clean_image_key(self):
+        """Make sure the uploaded image exists & is an image"""
+        image_key = self.cleaned_data['image_key']
+        if image_key:
+            try:
+                validate_upload(image_key)
+            except InvalidUpload as e:
+                raise forms.ValidationError(str(e))
+        return image_key
+
+    def save(self, commit=True):
+        """Point the product at the uploaded image, if there is one"""
+        product = super().save(commit=False)
+        if self.cleaned_data.get('image_key'):
+            product.image.name = self.cleaned_data['image_key']
+        if commit:
+            product.save()
+            self.save_m2m()
+        return product
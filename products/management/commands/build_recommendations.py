@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = ('Work out the similar & frequently bought together '
+            'products shown on each product page')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=4,
+            help='How many of each kind of recommendation to keep per product')
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1:
+            raise CommandError('--top-k must be at least 1')
+
+        created = build_recommendations(top_k=options['top_k'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {created} product recommendations'))
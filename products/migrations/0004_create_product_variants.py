@@ -0,0 +1,30 @@
+from django.db import migrations
+
+SIZES = ["xs", "s", "m", "l", "xl"]
+
+
+def create_variants(apps, schema_editor):
+    """
+    Give every existing product a variant for each of it's sizes,
+    or a single variant without a size
+    """
+    Product = apps.get_model("products", "Product")
+    ProductVariant = apps.get_model("products", "ProductVariant")
+
+    variants = []
+    for product in Product.objects.only("pk", "has_sizes").iterator():
+        for size in (SIZES if product.has_sizes else [""]):
+            variants.append(ProductVariant(product=product, size=size))
+
+    ProductVariant.objects.bulk_create(variants, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_productvariant"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_variants, migrations.RunPython.noop),
+    ]
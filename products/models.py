@@ -48,4 +48,103 @@ class Product(models.Model):
     image = models.ImageField(null=True, blank=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def create_variants(self):
+        """
+        Make sure the product has a variant for each of it's sizes,
+        or a single variant without a size if it doesn't have sizes.
+        Variants are never removed here, as orders may refer to them.
+        """
+        if self.has_sizes:
+            sizes = [size for size, label in ProductVariant.SIZE_CHOICES]
+        else:
+            sizes = [""]
+
+        existing = set(self.variants.values_list("size", flat=True))
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=self, size=size)
+            for size in sizes if size not in existing
+        ])
+
+
+# A variant is a specific version of a product that can be put in the bag,
+# such as a t-shirt in size M. Products without sizes have a single variant
+# with a blank size. The bag is keyed by variant id, so everything in it
+# can be looked up in a single query
+class ProductVariant(models.Model):
+
+    SIZE_CHOICES = (
+        ("xs", "XS"),
+        ("s", "S"),
+        ("m", "M"),
+        ("l", "L"),
+        ("xl", "XL"),
+    )
+
+    class Meta:
+        # A product only has one variant of each size
+        constraints = [
+            models.UniqueConstraint(fields=["product", "size"],
+                                    name="unique_product_variant"),
+        ]
+
+    product = models.ForeignKey("Product",
+                                on_delete=models.CASCADE,
+                                related_name="variants")
+
+    # Left blank for products that don't have sizes
+    size = models.CharField(max_length=2, choices=SIZE_CHOICES, blank=True, default="")
+
+    def __str__(self):
+        if self.size:
+            return f"{self.product.name} ({self.size.upper()})"
+        return self.product.name
+
+
+# Products recommended on a product's page, worked out ahead of time
+# by the build_recommendations management command, so the page can
+# read them with a single indexed query instead of working them out
+class ProductRecommendation(models.Model):
+
+    SIMILAR = "similar"
+    BOUGHT_TOGETHER = "bought_together"
+    KIND_CHOICES = (
+        (SIMILAR, "Similar products"),
+        (BOUGHT_TOGETHER, "Frequently bought together"),
+    )
+
+    class Meta:
+        # The product page reads a product's recommendations in rank order
+        indexes = [
+            models.Index(fields=["product", "kind", "rank"]),
+        ]
+
+    product = models.ForeignKey("Product",
+                                on_delete=models.CASCADE,
+                                related_name="recommendations")
+    recommended = models.ForeignKey("Product",
+                                    on_delete=models.CASCADE,
+                                    related_name="+")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+
+    # How many orders they were bought together in, or how close
+    # in price a similar product is, higher is a better match
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.product.name}: {self.recommended.name} ({self.kind})"
+
+
+# A single row counting changes to the catalog, bumped by signals
+# whenever a product or category is saved or deleted. Catalog pages
+# use it for their ETag & Last-Modified headers, so browsers can be
+# told their copy of a page is still up to date
+class CatalogVersion(models.Model):
+
+    version = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
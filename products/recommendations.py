@@ -0,0 +1,131 @@
+"""
+Work out the products to recommend on each product's page.
+
+There are two kinds of recommendation:
+- Frequently bought together: the products that appear in the
+  most orders alongside the product
+- Similar products: products in the same category that are
+  closest to the product's price
+
+Both are worked out by the build_recommendations management command
+and stored as ProductRecommendation rows, so the product page only has
+to read them. Order baskets are streamed a chunk at a time and counted
+in pairs with a Counter, so memory grows with the number of product
+pairs rather than the number of orders.
+"""
+from collections import Counter, defaultdict
+from itertools import chain, combinations, groupby
+
+from django.db import transaction
+
+from checkout.models import ArchivedOrderLineItem, OrderLineItem
+
+from .catalog_version import bump_catalog_version
+from .models import Product, ProductRecommendation
+
+
+def _baskets(chunk_size=2000):
+    """
+    Yield the set of product ids in each order, archived or not
+    """
+    # Archived orders keep their ids, so an order's line items
+    # are only ever in one of the tables
+    rows = chain.from_iterable(
+        model.objects.filter(product__isnull=False)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=chunk_size)
+        for model in (ArchivedOrderLineItem, OrderLineItem)
+    )
+    for order_id, items in groupby(rows, key=lambda row: row[0]):
+        yield {product_id for order_id, product_id in items}
+
+
+def bought_together(top_k):
+    """
+    Return a dict of {product id: [(product id, orders in common), ...]}
+    with up to top_k of the products most often bought with each product
+    """
+    pair_counts = Counter()
+    for basket in _baskets():
+        # Sorting means each pair is always counted in the same order
+        pair_counts.update(combinations(sorted(basket), 2))
+
+    neighbours = defaultdict(Counter)
+    for (first, second), count in pair_counts.items():
+        neighbours[first][second] = count
+        neighbours[second][first] = count
+
+    return {
+        product_id: counts.most_common(top_k)
+        for product_id, counts in neighbours.items()
+    }
+
+
+def similar(top_k):
+    """
+    Return a dict of {product id: [(product id, score), ...]} with up to
+    top_k of the products in the same category closest in price, scored
+    from 1 (the same price) down towards 0
+    """
+    by_category = defaultdict(list)
+    products = Product.objects.filter(category__isnull=False).values_list(
+        'pk', 'category_id', 'price')
+    for product_id, category_id, price in products:
+        by_category[category_id].append((float(price), product_id))
+
+    neighbours = {}
+    for prices in by_category.values():
+        prices.sort()
+
+        for index, (price, product_id) in enumerate(prices):
+            # The closest prices are either side of this product in the
+            # sorted list, so walk outwards taking whichever is closer
+            left, right = index - 1, index + 1
+            closest = []
+            while len(closest) < top_k and (left >= 0 or right < len(prices)):
+                if right >= len(prices) or (
+                        left >= 0 and price - prices[left][0] <= prices[right][0] - price):
+                    other_price, other_id = prices[left]
+                    left -= 1
+                else:
+                    other_price, other_id = prices[right]
+                    right += 1
+
+                score = 1 - abs(price - other_price) / max(price, other_price, 1)
+                closest.append((other_id, score))
+
+            neighbours[product_id] = closest
+
+    return neighbours
+
+
+def build_recommendations(top_k=4):
+    """
+    Replace every stored recommendation, returning how many were created
+    """
+    recommendations = []
+    for kind, neighbours in (
+            (ProductRecommendation.BOUGHT_TOGETHER, bought_together(top_k)),
+            (ProductRecommendation.SIMILAR, similar(top_k))):
+        for product_id, matches in neighbours.items():
+            recommendations.extend(
+                ProductRecommendation(
+                    product_id=product_id,
+                    recommended_id=recommended_id,
+                    kind=kind,
+                    score=score,
+                    rank=rank,
+                )
+                for rank, (recommended_id, score) in enumerate(matches)
+            )
+
+    # Swap the recommendations in one transaction, so product
+    # pages never see a half built set
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+        # Product pages show the recommendations, so they've changed
+        bump_catalog_version()
+
+    return len(recommendations)
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .catalog_version import bump_catalog_version
+from .categories import clear_categories
+from .models import Category, Product
+from .suggest import clear_index
+
+# Functions within this file are called each time a category
+# is saved or deleted, keeping the cached categories up to date,
+# and each time a product is saved, keeping it's variants up to date
+# Saving or deleting a product also clears the search suggestion index
+# Any product or category change bumps the catalog version, which
+# tells browsers their cached catalog pages are out of date
+
+
+@receiver(post_save, sender=Category)
+def clear_categories_on_save(sender, instance, **kwargs):
+    """
+    Clear the cached categories on category update/create
+    """
+    clear_categories()
+
+
+@receiver(post_delete, sender=Category)
+def clear_categories_on_delete(sender, instance, **kwargs):
+    """
+    Clear the cached categories on category delete
+    """
+    clear_categories()
+
+
+@receiver(post_save, sender=Product)
+def create_variants_on_save(sender, instance, **kwargs):
+    """
+    Create the product's variants on product update/create,
+    in case it's sizes have changed
+    """
+    instance.create_variants()
+
+
+
+@receiver(post_save, sender=Product)
+def clear_suggest_index_on_save(sender, instance, **kwargs):
+    """
+    Clear the search suggestion index on product update/create
+    """
+    clear_index()
+
+
+@receiver(post_delete, sender=Product)
+def clear_suggest_index_on_delete(sender, instance, **kwargs):
+    """
+    Clear the search suggestion index on product delete
+    """
+    clear_index()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version_on_change(sender, instance, **kwargs):
+    """
+    Bump the catalog version on product or category update/create/delete
+    """
+    bump_catalog_version()
@@ -0,0 +1,116 @@
+"""
+An in-process prefix index of product names & SKUs for search suggestions.
+
+The index is a sorted list of lowercase search terms. Finding every
+term starting with what the customer has typed is a binary search
+(bisect) to the first match, then a walk forward until the terms stop
+matching, so suggestions never touch the database.
+
+Each product is indexed by it's whole name, the name from each word
+onwards (so "shirt" finds "Arizona Cardinals Shirt") and it's SKU.
+Like the category registry, the index is built the first time it's
+needed, cleared by signals whenever a product is saved or deleted, and
+rebuilt every SUGGEST_INDEX_TIMEOUT seconds for changes made by other
+processes.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from boutique_ado.db_routing import use_primary
+
+from .models import Product
+
+SUGGEST_INDEX_TIMEOUT = 300
+
+_index = None
+_loaded_at = 0
+_lock = threading.Lock()
+
+
+def _terms(name, sku):
+    """
+    Return the lowercase terms a product can be found by
+    """
+    words = name.lower().split()
+    terms = {' '.join(words[i:]) for i in range(len(words))}
+    if sku:
+        terms.add(sku.lower())
+    return terms
+
+
+def _build_index():
+    """
+    Return a tuple of (sorted terms, product id for each term, products)
+    where products is a dict of {product id: (name, sku)}
+    """
+    products = {}
+    entries = []
+    for product_id, name, sku in Product.objects.values_list('pk', 'name', 'sku').iterator():
+        products[product_id] = (name, sku)
+        entries.extend((term, product_id) for term in _terms(name, sku))
+
+    entries.sort()
+    terms = [term for term, product_id in entries]
+    product_ids = [product_id for term, product_id in entries]
+    return terms, product_ids, products
+
+
+def _is_stale(index):
+    return index is None or time.monotonic() - _loaded_at > SUGGEST_INDEX_TIMEOUT
+
+
+def get_index():
+    """
+    Return the index, building it if it's not cached
+    """
+    global _index, _loaded_at
+
+    index = _index
+    if _is_stale(index):
+        with _lock:
+            # Another thread may have reloaded it while we waited for
+            # the lock, in which case there's no need to load it again
+            index = _index
+            if _is_stale(index):
+                # Kept for minutes, so always loaded from the primary
+                with use_primary():
+                    index = _build_index()
+                _index = index
+                _loaded_at = time.monotonic()
+
+    return index
+
+
+def suggest(query, limit=10):
+    """
+    Return up to limit products whose name, a word in their name
+    or SKU starts with the query, as a list of (id, name, sku)
+    """
+    query = ' '.join(query.lower().split())
+    if not query:
+        return []
+
+    terms, product_ids, products = get_index()
+    suggestions = []
+    seen = set()
+
+    position = bisect_left(terms, query)
+    while position < len(terms) and terms[position].startswith(query):
+        product_id = product_ids[position]
+        if product_id not in seen:
+            seen.add(product_id)
+            suggestions.append((product_id, *products[product_id]))
+            if len(suggestions) == limit:
+                break
+        position += 1
+
+    return suggestions
+
+
+def clear_index():
+    """
+    Empty the index, so it's built again next time
+    """
+    global _index
+    _index = None
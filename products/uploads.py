@@ -0,0 +1,141 @@
+"""
+Upload product images straight to storage from the browser.
+
+Rather than posting the image with the product form, which holds a
+worker while the image arrives & is then re-uploaded to S3, the browser
+asks for an upload first. On S3 this is a presigned POST, so the image
+goes directly to the bucket. Without S3 the image is posted to
+receive_image_upload, which checks a signed token in place of S3's
+signature, so the browser follows the same steps either way.
+
+The product form is then sent with just the key of the uploaded image,
+which is checked before it's saved as the product's image.
+"""
+import posixpath
+import re
+import uuid
+
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.middleware.csrf import get_token
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+
+from storages.backends.s3boto3 import S3Boto3Storage
+
+UPLOAD_DIRECTORY = 'product_images'
+UPLOAD_EXPIRY_SECONDS = 600
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+
+IMAGE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+# The first bytes of each type of image we accept
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+UPLOAD_KEY = re.compile(rf'^{UPLOAD_DIRECTORY}/[0-9a-f]{{32}}/[^/]+$')
+
+TOKEN_SALT = 'products.uploads'
+
+
+class InvalidUpload(Exception):
+    """The uploaded image is missing or isn't an image we accept"""
+
+
+def _uses_s3():
+    return isinstance(default_storage, S3Boto3Storage)
+
+
+def _storage_key(key):
+    """The key of the image in the bucket, which includes the media folder"""
+    return posixpath.join(default_storage.location, key)
+
+
+def create_upload(request, filename, content_type):
+    """
+    Return a dict of the key the image will be saved as, the url to
+    post it to & the form fields to send along with the file
+    """
+    if content_type not in IMAGE_CONTENT_TYPES:
+        raise InvalidUpload('Images must be a JPEG, PNG, GIF or WebP')
+
+    filename = get_valid_filename(posixpath.basename(filename)) or 'image'
+    key = f'{UPLOAD_DIRECTORY}/{uuid.uuid4().hex}/{filename}'
+
+    if _uses_s3():
+        fields = {'Content-Type': content_type}
+        cache_control = default_storage.object_parameters.get('CacheControl')
+        if cache_control:
+            fields['Cache-Control'] = cache_control
+
+        # S3 rejects the upload if it doesn't match these conditions
+        conditions = [{name: value} for name, value in fields.items()]
+        conditions.append(['content-length-range', 1, MAX_IMAGE_SIZE])
+
+        upload = default_storage.bucket.meta.client.generate_presigned_post(
+            Bucket=default_storage.bucket_name,
+            Key=_storage_key(key),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=UPLOAD_EXPIRY_SECONDS,
+        )
+        return {'key': key, 'url': upload['url'], 'fields': upload['fields']}
+
+    token = signing.dumps({'key': key, 'content_type': content_type}, salt=TOKEN_SALT)
+    return {
+        'key': key,
+        'url': reverse('receive_image_upload'),
+        'fields': {
+            'token': token,
+            'csrfmiddlewaretoken': get_token(request),
+        },
+    }
+
+
+def receive_upload(token, uploaded_file):
+    """
+    Save an image posted to our own upload view, when not using S3
+    """
+    try:
+        upload = signing.loads(token, salt=TOKEN_SALT, max_age=UPLOAD_EXPIRY_SECONDS)
+    except signing.BadSignature:
+        raise InvalidUpload('The upload has expired, please choose the image again')
+
+    if uploaded_file.size > MAX_IMAGE_SIZE:
+        raise InvalidUpload('Images must be 10MB or smaller')
+
+    return default_storage.save(upload['key'], uploaded_file)
+
+
+def _read_head(key, length=16):
+    """
+    Read the first bytes of an uploaded image, without downloading the rest
+    """
+    if _uses_s3():
+        response = default_storage.bucket.Object(_storage_key(key)).get(
+            Range=f'bytes=0-{length - 1}')
+        return response['Body'].read()
+
+    with default_storage.open(key) as f:
+        return f.read(length)
+
+
+def validate_upload(key):
+    """
+    Make sure the key is one of our uploads, that it was uploaded
+    & that it's an image, returning the key
+    """
+    if not UPLOAD_KEY.match(key):
+        raise InvalidUpload('That is not an uploaded image')
+
+    if not default_storage.exists(key):
+        raise InvalidUpload('The image was not uploaded, please try again')
+
+    if default_storage.size(key) > MAX_IMAGE_SIZE:
+        raise InvalidUpload('Images must be 10MB or smaller')
+
+    head = _read_head(key)
+    is_webp = head[:4] == b'RIFF' and head[8:12] == b'WEBP'
+    if not (head.startswith(IMAGE_SIGNATURES) or is_webp):
+        raise InvalidUpload('The uploaded file is not an image')
+
+    return key
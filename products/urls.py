@@ -14,8 +14,11 @@ from . import views
 
 urlpatterns = [
     path('', views.all_products, name="products"),
+    path('suggest/', views.suggest_products, name="suggest_products"),
     path('<int:product_id>/', views.product_detail, name="product_detail"),
     path('add/', views.add_product, name="add_product"),
+    path('upload/', views.create_image_upload, name="create_image_upload"),
+    path('upload/local/', views.receive_image_upload, name="receive_image_upload"),
     path('edit/<int:product_id>/', views.edit_product, name='edit_product'),
     path('delete/<int:product_id>/', views.delete_product, name='delete_product'),
 ]
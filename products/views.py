@@ -1,5 +1,8 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.contrib import messages
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 
 # For superuser security (made sure superuser functionality is)
 # only accessable to super users
@@ -12,18 +15,33 @@ from django.contrib.auth.decorators import login_required
 # The Q object allows us to do name OR description
 from django.db.models import Q
 from django.db.models.functions import Lower
-from .models import Product, Category
+from home.page_cache import cache_anonymous_page
+from .models import Product, ProductRecommendation
 from .forms import ProductForm
+from .categories import get_categories_by_name
+from .suggest import suggest
+from .facets import get_facets, get_selected, filter_products, facet_counts
+from .catalog_version import catalog_etag, catalog_last_modified
+from .uploads import InvalidUpload, create_upload, receive_upload
 
 
 # Create your views here.
+
+# Catalog pages send an ETag & Last-Modified header, so browsers that
+# already have the latest version of the page get a 304 instead
+# no_cache makes browsers check back each time, as the bag can change
+# Anonymous visitors are served the pages from the page cache
+@cache_anonymous_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def all_products(request):
     """
     View to show all producuts, including sorting & search queries
     """
 
     # Return all products within database using all()
-    products = Product.objects.all()
+    # Each product shows it's category, so get them in the same query
+    products = Product.objects.all().select_related('category')
     query = None
     categories = None
     sort = None
@@ -49,11 +67,6 @@ def all_products(request):
 
             products = products.order_by(sort_key)
 
-        if "category" in request.GET:
-            categories = request.GET["category"].split(",")
-            products = products.filter(category__name__in=categories)
-            categories = Category.objects.filter(name__in=categories)
-
         if 'q' in request.GET:
 
             query = request.GET["q"]
@@ -74,6 +87,17 @@ def all_products(request):
             # Filter all products that match the query inserted
             products = products.filter(queries)
 
+    # Filter by the selected facets (category, price, rating & sizes)
+    # The counts are worked out before filtering, so each facet's
+    # counts still include products outside of it's own selection
+    facets = get_facets()
+    selected = get_selected(request.GET, facets)
+    facet_list = facet_counts(products, facets, selected, request.GET)
+    products = filter_products(products, facets, selected)
+
+    if "category" in selected:
+        categories = get_categories_by_name(selected["category"])
+
     current_sorting = f'{sort}_{direction}'
 
     # Add products to context to send them to template
@@ -82,25 +106,70 @@ def all_products(request):
         "search_term": query,
         "current_categories": categories,
         "current_sorting": current_sorting,
+        "facets": facet_list,
+        "current_facets": selected,
     }
 
     return render(request, "products/products.html", context)
 
+@cache_anonymous_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def product_detail(request, product_id):
     """
     View details regarding an individual product
     """
 
-    # Return all products within database using all()
-    product = get_object_or_404(Product, pk=product_id)
+    # Get the product along with it's variants, which
+    # are the sizes it can be added to the bag in
+    product = get_object_or_404(Product.objects.prefetch_related("variants"), pk=product_id)
+
+    # Recommendations are worked out ahead of time by the
+    # build_recommendations command, so both kinds are read
+    # in one query along with the recommended products
+    recommendations = (
+        ProductRecommendation.objects
+        .filter(product=product)
+        .select_related("recommended")
+        .order_by("kind", "rank")
+    )
+    bought_together = []
+    similar_products = []
+    for recommendation in recommendations:
+        if recommendation.kind == ProductRecommendation.BOUGHT_TOGETHER:
+            bought_together.append(recommendation.recommended)
+        else:
+            similar_products.append(recommendation.recommended)
 
     # Add products to context to send them to template
     context = {
-        "product": product
+        "product": product,
+        "bought_together": bought_together,
+        "similar_products": similar_products,
     }
 
     return render(request, "products/product_detail.html", context)
 
+def suggest_products(request):
+    """
+    Return products matching what's been typed into the search box
+    as JSON, for suggestions as the customer types.
+    These come from an in-memory index, so no queries are made
+    """
+    query = request.GET.get("q", "")
+
+    suggestions = [
+        {
+            "id": product_id,
+            "name": name,
+            "sku": sku,
+            "url": reverse("product_detail", args=[product_id]),
+        }
+        for product_id, name, sku in suggest(query)
+    ]
+
+    return JsonResponse({"suggestions": suggestions})
+
 @login_required
 def add_product(request):
     """ Render add product template to add a product to the store """
@@ -143,6 +212,48 @@ def add_product(request):
 
     return render(request, template, context)
 
+@login_required
+@require_POST
+def create_image_upload(request):
+    """
+    Return where & how the browser should upload a product image,
+    so it can be sent straight to storage instead of with the form
+    """
+
+    if not request.user.is_superuser:
+        return JsonResponse({"error": "Sorry, only store owners can do that"}, status=403)
+
+    try:
+        upload = create_upload(request,
+                               request.POST.get("filename", ""),
+                               request.POST.get("content_type", ""))
+    except InvalidUpload as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(upload)
+
+@login_required
+@require_POST
+def receive_image_upload(request):
+    """
+    Save a product image uploaded by the browser,
+    used in place of S3 when media files are stored locally
+    """
+
+    if not request.user.is_superuser:
+        return HttpResponse(status=403)
+
+    if "file" not in request.FILES:
+        return HttpResponse("No image was uploaded", status=400)
+
+    try:
+        receive_upload(request.POST.get("token", ""), request.FILES["file"])
+    except InvalidUpload as e:
+        return HttpResponse(str(e), status=400)
+
+    # The same response S3 gives for a successful upload
+    return HttpResponse(status=204)
+
 @login_required
 def edit_product(request, product_id):
     """ Edit a product in the store """
@@ -32,13 +32,23 @@ class UserProfile(models.Model):
 
 
 # recieves from the post)save event from the user model
-# if new, create new, otherwise save to existing user
+# if new, create new, otherwise make sure the existing user has one
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """
-    Create or update the user profile
+    Create the user profile, or make sure an existing user has one
     """
     if created:
         UserProfile.objects.create(user=instance)
-    # Existing users: just save the profile
-    instance.userprofile.save()
\ No newline at end of file
+        return
+
+    # Django saves just the last_login field each time a user logs in
+    # Nothing on the profile depends on it, so there's nothing to do
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+
+    # None of the profile's fields come from the user, so saving the
+    # profile would write the same values back. Instead we only create
+    # one for users that don't have a profile, e.g those made before
+    # profiles existed
+    UserProfile.objects.get_or_create(user=instance)
@@ -1,10 +1,12 @@
 from django.shortcuts import render, get_object_or_404
+from django.http import Http404
 from django.contrib import messages
 
 # For superuser security (made sure superuser functionality is)
 # only accessable to super users
 from django.contrib.auth.decorators import login_required
 
+from checkout.archive import get_order, get_profile_orders
 from checkout.models import Order
 
 from .models import UserProfile
@@ -37,8 +39,8 @@ def profile(request):
     # Build instance of form using the profile
         form = UserProfileForm(instance=profile)
 
-    # Get profile's order history
-    orders = profile.orders.all()
+    # Get profile's order history, including archived orders
+    orders = get_profile_orders(profile)
 
     template = 'profiles/profile.html'
 
@@ -59,8 +61,11 @@ def order_history(request, order_number):
     Displays order history
     """
 
-    # Grab order from order model above
-    order = get_object_or_404(Order, order_number=order_number)
+    # Grab the order, which may have been moved to the archive
+    try:
+        order = get_order(order_number)
+    except Order.DoesNotExist:
+        raise Http404('No order found with that number')
 
     # Add message informing user they're looking
     # at past order information
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailySalesRollup
+from .rollups import sales_report
+
+
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    # The rollups are built by the refresh_sales_rollups
+    # command, so they can be browsed but not edited
+    list_display = ('date', 'dimension', 'label',
+                    'revenue', 'units', 'order_count')
+
+    list_filter = ('dimension',)
+
+    date_hierarchy = 'date'
+
+    ordering = ('-date', 'dimension', '-revenue')
+
+    # Adds a link to the sales dashboard above the list
+    change_list_template = 'admin/reports/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        """Add the sales dashboard to this model's admin urls"""
+        urls = [
+            path('dashboard/',
+                 self.admin_site.admin_view(self.dashboard_view),
+                 name='reports_dailysalesrollup_dashboard'),
+        ]
+        return urls + super().get_urls()
+
+    def dashboard_view(self, request):
+        """
+        Show the totals for each dimension over a range of days,
+        defaulting to the last 30 days
+        """
+        end = parse_date(request.GET.get('end', '')) or timezone.localdate()
+        start = parse_date(request.GET.get('start', '')) or end - timedelta(days=29)
+
+        reports = [
+            (label, sales_report(dimension, start, end)[:20])
+            for dimension, label in DailySalesRollup.DIMENSION_CHOICES
+        ]
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Sales dashboard',
+            'start': start,
+            'end': end,
+            'reports': reports,
+        }
+
+        return TemplateResponse(request, 'admin/reports/dashboard.html', context)
+
+
+admin.site.register(DailySalesRollup, DailySalesRollupAdmin)
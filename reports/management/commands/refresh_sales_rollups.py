@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from reports.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Add orders placed since the last refresh to the daily sales rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Also rebuild every day from this date (YYYY-MM-DD), '
+                 'e.g after older orders have been edited')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date in the form YYYY-MM-DD')
+
+        days = refresh_rollups(since=since)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the sales rollups for {len(days)} days'))
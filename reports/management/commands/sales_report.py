@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from boutique_ado.db_routing import use_replica
+from reports.models import DailySalesRollup
+from reports.rollups import sales_report
+
+
+class Command(BaseCommand):
+    help = 'Print sales by product, category, size or country from the daily rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dimension',
+            choices=[choice for choice, label in DailySalesRollup.DIMENSION_CHOICES])
+        parser.add_argument('--start', help='First day (YYYY-MM-DD), defaults to 30 days ago')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--by-day', action='store_true', help='Show a row for each day')
+
+    def _parse_date(self, value, default):
+        if not value:
+            return default
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'{value} is not a date in the form YYYY-MM-DD')
+        return parsed
+
+    def handle(self, *args, **options):
+        end = self._parse_date(options['end'], timezone.localdate())
+        start = self._parse_date(options['start'], end - timedelta(days=29))
+
+        # Reports only read, so they can use the read replica
+        with use_replica():
+            report = list(sales_report(options['dimension'], start, end,
+                                       by_day=options['by_day']))
+
+        for row in report:
+            day = f'{row["date"]}  ' if options['by_day'] else ''
+            self.stdout.write(
+                f'{day}{row["label"]:<40} ${row["revenue"]:>10.2f}  '
+                f'{row["units"]:>6} units  {row["order_count"]:>6} orders')
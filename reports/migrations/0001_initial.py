@@ -0,0 +1,43 @@
+# Generated by Django 3.2 on 2026-10-19 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(choices=[('product', 'Product'), ('category', 'Category'), ('size', 'Size'), ('country', 'Country')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=254)),
+                ('label', models.CharField(blank=True, max_length=254)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('units', models.IntegerField(default=0)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesrollup',
+            index=models.Index(fields=['dimension', 'date'], name='reports_dai_dimensi_52b8d3_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'dimension', 'key'), name='unique_daily_sales_rollup'),
+        ),
+    ]
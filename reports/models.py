@@ -0,0 +1,63 @@
+from django.db import models
+
+# Reports are read from these pre-aggregated tables rather than from
+# the orders & line items themselves, so they take the same time to
+# run no matter how many orders there are.
+# The tables are kept up to date by the refresh_sales_rollups command
+
+
+class DailySalesRollup(models.Model):
+    """
+    Revenue, units & number of orders for a single day,
+    for one product, category, size or country
+    """
+
+    PRODUCT = 'product'
+    CATEGORY = 'category'
+    SIZE = 'size'
+    COUNTRY = 'country'
+
+    DIMENSION_CHOICES = (
+        (PRODUCT, 'Product'),
+        (CATEGORY, 'Category'),
+        (SIZE, 'Size'),
+        (COUNTRY, 'Country'),
+    )
+
+    class Meta:
+        # Each day only has one row per product, category etc.
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'dimension', 'key'],
+                                    name='unique_daily_sales_rollup'),
+        ]
+        # Reports look up a dimension over a range of days
+        indexes = [
+            models.Index(fields=['dimension', 'date']),
+        ]
+
+    date = models.DateField()
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+
+    # What the row is for within the dimension, such as the product's id,
+    # the category's name or the country's code, along with a readable label
+    key = models.CharField(max_length=254, blank=True)
+    label = models.CharField(max_length=254, blank=True)
+
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    order_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.date} {self.dimension} {self.label}'
+
+
+class RollupState(models.Model):
+    """
+    Keeps track of the last order included in the rollups,
+    so each refresh only has to look at orders placed since
+    """
+    last_order_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Rollups up to order {self.last_order_id}'
@@ -0,0 +1,161 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from checkout.models import ArchivedOrderLineItem, Order, OrderLineItem
+
+from .models import DailySalesRollup, RollupState
+
+# Orders placed more recently than this are left for the next refresh.
+# Order ids are handed out when orders are inserted, so an order still
+# being saved can have a lower id than one that's already been saved,
+# and would be skipped if the refresh moved past it
+ROLLUP_GRACE_PERIOD = timedelta(minutes=1)
+
+
+def _day_range(day):
+    """
+    The start & end of a day as datetimes, so the order's date
+    index can be used rather than truncating every order's date
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _rollup_rows(lineitems):
+    """
+    Aggregate some line items into (dimension, key, label, totals) rows
+    """
+    totals = {
+        'revenue': Sum('lineitem_total'),
+        'units': Sum('quantity'),
+        'order_count': Count('order', distinct=True),
+    }
+
+    for row in lineitems.values('product_id', 'product__name').annotate(**totals):
+        yield (DailySalesRollup.PRODUCT, str(row['product_id']),
+               row['product__name'], row)
+
+    for row in lineitems.values('product__category__name',
+                                'product__category__friendly_name').annotate(**totals):
+        yield (DailySalesRollup.CATEGORY, row['product__category__name'] or '',
+               row['product__category__friendly_name'] or 'No category', row)
+
+    for row in lineitems.values('product_size').annotate(**totals):
+        yield (DailySalesRollup.SIZE, row['product_size'] or '',
+               (row['product_size'] or 'No size').upper(), row)
+
+    for row in lineitems.values('order__country').annotate(**totals):
+        yield (DailySalesRollup.COUNTRY, row['order__country'],
+               row['order__country'], row)
+
+
+def _build_day(day):
+    """
+    Aggregate a single day's orders into rollup rows
+    Old orders may have been moved to the archive, so the archived line
+    items are added in too. An order is only ever in one of the two
+    tables, so their order counts can be added together.
+    """
+    start, end = _day_range(day)
+    rows = {}
+
+    for model in (OrderLineItem, ArchivedOrderLineItem):
+        lineitems = model.objects.filter(order__date__gte=start,
+                                         order__date__lt=end)
+        for dimension, key, label, totals in _rollup_rows(lineitems):
+            rollup = rows.get((dimension, key))
+            if rollup is None:
+                rows[(dimension, key)] = DailySalesRollup(
+                    date=day, dimension=dimension, key=key, label=label,
+                    revenue=totals['revenue'], units=totals['units'],
+                    order_count=totals['order_count'])
+            else:
+                rollup.revenue += totals['revenue']
+                rollup.units += totals['units']
+                rollup.order_count += totals['order_count']
+
+    return list(rows.values())
+
+
+def rebuild_days(days):
+    """
+    Replace the rollups for each of the given days
+    """
+    for day in days:
+        with transaction.atomic():
+            DailySalesRollup.objects.filter(date=day).delete()
+            DailySalesRollup.objects.bulk_create(_build_day(day))
+
+
+def refresh_rollups(since=None):
+    """
+    Bring the rollups up to date with the orders placed since the last
+    refresh, rebuilding only the days those orders fall on.
+    Orders from the last ROLLUP_GRACE_PERIOD are left for the next refresh.
+    Passing since also rebuilds every day from that date, which picks up
+    older orders that have been edited.
+    Returns the days that were rebuilt.
+    """
+    state, created = RollupState.objects.get_or_create(pk=1)
+
+    new_orders = Order.objects.filter(pk__gt=state.last_order_id)
+
+    # Stop just before the first order inside the grace period. An
+    # order's date is set before it's inserted & given an id, so ids &
+    # dates aren't always in the same order, and moving past any
+    # recent order could skip one that's still being saved
+    first_recent_id = new_orders.filter(
+        date__gt=timezone.now() - ROLLUP_GRACE_PERIOD).aggregate(Min('pk'))['pk__min']
+    if first_recent_id is not None:
+        new_orders = new_orders.filter(pk__lt=first_recent_id)
+    last_order_id = new_orders.aggregate(Max('pk'))['pk__max']
+
+    days = set(
+        new_orders.annotate(day=TruncDate('date'))
+        .values_list('day', flat=True).distinct()
+    )
+
+    if since:
+        today = timezone.localdate()
+        day = since
+        while day <= today:
+            days.add(day)
+            day += timedelta(days=1)
+
+    rebuild_days(sorted(days))
+
+    if last_order_id:
+        state.last_order_id = last_order_id
+    state.refreshed_at = timezone.now()
+    state.save()
+
+    return sorted(days)
+
+
+def sales_report(dimension, start, end, by_day=False):
+    """
+    Total revenue, units & orders for a dimension between
+    two dates (inclusive), read only from the rollups.
+    With by_day, there's a row for each day as well.
+    """
+    fields = ['key', 'label']
+    if by_day:
+        fields.insert(0, 'date')
+
+    # Orders containing several products are in more than one product's
+    # order_count, so they're counted per product rather than overall
+    report = (
+        DailySalesRollup.objects
+        .filter(dimension=dimension, date__gte=start, date__lte=end)
+        .values(*fields)
+        .annotate(revenue=Sum('revenue'), units=Sum('units'),
+                  order_count=Sum('order_count'))
+    )
+
+    if by_day:
+        return report.order_by('date', '-revenue')
+    return report.order_by('-revenue')